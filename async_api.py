@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+DocGen - Asyncio API
+
+Async wrappers around DocumentGenerator and DocumentFormatter with a shared
+concurrency limit, plus batch interfaces that read jobs from a (possibly
+async) source through a bounded queue and yield results as they finish.
+"""
+
+import asyncio
+import copy
+import functools
+from concurrent.futures import Executor, ThreadPoolExecutor
+from typing import Any, AsyncIterator, Dict, NamedTuple, Optional, Tuple
+
+from document_generator import DocumentGenerator
+from doc_formatter import DocumentFormatter
+
+
+class BatchResult(NamedTuple):
+    """Outcome of one batch job."""
+    job: Tuple
+    output: Optional[str]
+    error: Optional[BaseException]
+
+
+# Marks the end of the job queue / of a worker's results
+_DONE = object()
+
+
+class AsyncDocGen:
+    """Asyncio front end for document generation and formatting."""
+    
+    def __init__(
+        self,
+        generator: DocumentGenerator = None,
+        formatter: DocumentFormatter = None,
+        concurrency: int = 4,
+        queue_size: int = None,
+        executor: Executor = None,
+    ):
+        """Initialize with a concurrency limit and batch queue size."""
+        if concurrency < 1:
+            raise ValueError("concurrency must be at least 1")
+        self.generator = generator or DocumentGenerator()
+        self.formatter = formatter or DocumentFormatter()
+        self.concurrency = concurrency
+        self.queue_size = queue_size or concurrency * 2
+        self._own_executor = executor is None
+        self._executor = executor or ThreadPoolExecutor(max_workers=concurrency)
+        # Created on first use so it binds to the running event loop
+        self._semaphore = None
+    
+    async def _run(self, func, *args):
+        """Run a blocking call in the executor, within the concurrency limit."""
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        async with self._semaphore:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, functools.partial(func, *args))
+    
+    def _format_from_file(self, input_file: str, output_path: str) -> str:
+        """Format with a private formatter copy, since formatting keeps per-document state."""
+        return copy.copy(self.formatter).format_from_file(input_file, output_path)
+    
+    async def agenerate_document(
+        self,
+        template_name: str,
+        output_name: str,
+        variables: Optional[Dict[str, Any]] = None,
+    ) -> str:
+        """Generate a DOCX document from a template."""
+        return await self._run(self.generator.generate_document, template_name, output_name, variables)
+    
+    async def agenerate_session(
+        self,
+        session_key: str,
+        template_name: str,
+        output_name: str,
+        variables: Optional[Dict[str, Any]] = None,
+    ) -> str:
+        """Generate a document, re-rendering only what changed in the session."""
+        return await self._run(self.generator.generate_session, session_key, template_name, output_name, variables)
+    
+    async def aformat_from_file(self, input_file: str, output_path: str) -> str:
+        """Read content from file and format it."""
+        return await self._run(self._format_from_file, input_file, output_path)
+    
+    def agenerate_batch(self, jobs) -> AsyncIterator[BatchResult]:
+        """Generate (template_name, output_name, variables) jobs from an
+        iterable or async iterable, yielding results as they finish."""
+        return self._batch(jobs, self.generator.generate_document)
+    
+    def aformat_batch(self, jobs) -> AsyncIterator[BatchResult]:
+        """Format (input_file, output_path) jobs from an iterable or async
+        iterable, yielding results as they finish."""
+        return self._batch(jobs, self._format_from_file)
+    
+    async def _batch(self, jobs, func) -> AsyncIterator[BatchResult]:
+        """Feed jobs through a bounded queue to a fixed set of workers.
+        
+        The source is only read while the job queue has room, and workers
+        stop picking up jobs while the result queue is full, so memory stays
+        bounded by queue_size no matter how fast the source or how slow the
+        consumer is.
+        """
+        job_queue = asyncio.Queue(maxsize=self.queue_size)
+        result_queue = asyncio.Queue(maxsize=self.queue_size)
+        source_error = []
+        
+        async def produce():
+            try:
+                if hasattr(jobs, '__aiter__'):
+                    async for job in jobs:
+                        await job_queue.put(job)
+                else:
+                    for job in jobs:
+                        await job_queue.put(job)
+            except Exception as e:
+                source_error.append(e)
+            # Not reached when cancelled: nothing drains the queue any more
+            for _ in range(self.concurrency):
+                await job_queue.put(_DONE)
+        
+        async def work():
+            while True:
+                job = await job_queue.get()
+                if job is _DONE:
+                    await result_queue.put(_DONE)
+                    return
+                try:
+                    output = await self._run(func, *job)
+                    result = BatchResult(job, output, None)
+                except Exception as e:
+                    result = BatchResult(job, None, e)
+                await result_queue.put(result)
+        
+        tasks = [asyncio.ensure_future(produce())]
+        tasks += [asyncio.ensure_future(work()) for _ in range(self.concurrency)]
+        try:
+            running = self.concurrency
+            while running:
+                result = await result_queue.get()
+                if result is _DONE:
+                    running -= 1
+                else:
+                    yield result
+            if source_error:
+                raise source_error[0]
+        finally:
+            # Consumer stopped early or failed - don't leave workers behind
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+    
+    def close(self):
+        """Shut down the executor if it was created here, waiting for
+        running jobs. Blocks; use aclose from a coroutine."""
+        if self._own_executor:
+            self._executor.shutdown(wait=True)
+    
+    async def aclose(self):
+        """Shut down the executor without blocking the event loop."""
+        if self._own_executor:
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(None, self.close)
+    
+    async def __aenter__(self):
+        return self
+    
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.aclose()
@@ -6,23 +6,185 @@ Format Word documents according to defined styles (fonts, sizes, spacing, etc.)
 Support both DOCX input and text/markdown input.
 """
 
+import hashlib
 import json
 import os
 import re
+import time
+from collections import Counter
+from datetime import datetime
 from pathlib import Path
-from typing import Dict, Any
+from typing import Dict, Any, Callable, List, Optional, Tuple
 from docx import Document
+from docx.oxml.ns import qn
 from docx.shared import Pt, Cm
 from docx.enum.text import WD_ALIGN_PARAGRAPH
+from docx.text.paragraph import Paragraph
+
+from docx_compact import CompactionStats
+from docx_io import save_document
+from docx_normalize import normalize_document
+from markdown_compiler import compile_markdown
+
+
+# Chinese numbering patterns: 一、二、三... or 1、2、3... and (1) (2)...
+HEADING1_RE = re.compile(r'^[一二三四五六七八九十\d]+\s*[\.\、：:]')
+HEADING2_RE = re.compile(r'^[（\(]\s*\d+[）\)]')
+
+# Largest font size only counts as a title if used by at most this many paragraphs
+TITLE_MAX_PARAGRAPHS = 2
+# Bold paragraphs at body size up to this length count as headings
+BOLD_HEADING_MAX_CHARS = 60
+
+
+def _on_off(el) -> Optional[bool]:
+    """Read a w:b style on/off element."""
+    if el is None:
+        return None
+    return el.get(qn('w:val'), 'true') not in ('false', '0', 'off')
+
+
+class StyleResolver:
+    """Resolve effective font size and boldness through style inheritance.
+    
+    Style lookups are memoized per style id, so classifying a document costs
+    one walk of each style's basedOn chain rather than one per paragraph.
+    """
+    
+    def __init__(self, document):
+        """Index the styles part of a document."""
+        styles = document.styles.element
+        self._styles = {}
+        self._default_style = None
+        for style in styles.iterchildren(qn('w:style')):
+            style_id = style.get(qn('w:styleId'))
+            self._styles[style_id] = style
+            if style.get(qn('w:type')) == 'paragraph' and style.get(qn('w:default')) in ('1', 'true', 'on'):
+                self._default_style = style_id
+        
+        rpr = styles.find(f"{qn('w:docDefaults')}/{qn('w:rPrDefault')}/{qn('w:rPr')}")
+        self._defaults = (self._rpr_size(rpr), _on_off(rpr.find(qn('w:b'))) if rpr is not None else None)
+        self._cache = {}
+        self._char_cache = {}
+    
+    @staticmethod
+    def _rpr_size(rpr) -> Optional[float]:
+        """Read the font size in points from a w:rPr element."""
+        if rpr is None:
+            return None
+        sz = rpr.find(qn('w:sz'))
+        if sz is None or sz.get(qn('w:val')) is None:
+            return None
+        return int(sz.get(qn('w:val'))) / 2
+    
+    def style_info(self, style_id: Optional[str]) -> Tuple:
+        """Get (size, bold, outline_level, is_title) for a paragraph style id."""
+        if style_id is None:
+            style_id = self._default_style
+        return self._resolve(style_id, self._cache, (*self._defaults, None, False))
+    
+    def char_style_info(self, style_id: str) -> Tuple:
+        """Get (size, bold, outline_level, is_title) for a character style id.
+        
+        Unlike paragraph styles there is no fallback to the document
+        defaults: None means the style does not set the property.
+        """
+        return self._resolve(style_id, self._char_cache, (None, None, None, False))
+    
+    def _resolve(self, style_id: str, cache: dict, root: Tuple) -> Tuple:
+        """Resolve a style through its basedOn chain, ending at root."""
+        if style_id in cache:
+            return cache[style_id]
+        
+        # Guard against basedOn cycles in malformed documents
+        cache[style_id] = (None, None, None, False)
+        style = self._styles.get(style_id)
+        if style is None:
+            info = root
+        else:
+            based_on = style.find(qn('w:basedOn'))
+            if based_on is not None:
+                base = self._resolve(based_on.get(qn('w:val')), cache, root)
+            else:
+                base = root
+            
+            rpr = style.find(qn('w:rPr'))
+            size = self._rpr_size(rpr)
+            bold = _on_off(rpr.find(qn('w:b'))) if rpr is not None else None
+            outline = style.find(f"{qn('w:pPr')}/{qn('w:outlineLvl')}")
+            name = style.find(qn('w:name'))
+            name = name.get(qn('w:val'), '').lower() if name is not None else ''
+            info = (
+                size if size is not None else base[0],
+                bold if bold is not None else base[1],
+                int(outline.get(qn('w:val'))) if outline is not None else base[2],
+                name == 'title' or base[3],
+            )
+        cache[style_id] = info
+        return info
+    
+    def paragraph_info(self, p) -> Tuple:
+        """Get (size, bold, outline_level, is_title) for a w:p element.
+        
+        Size and boldness are those of the majority of the paragraph's text.
+        """
+        pstyle = p.find(f"{qn('w:pPr')}/{qn('w:pStyle')}")
+        para_info = self.style_info(pstyle.get(qn('w:val')) if pstyle is not None else None)
+        
+        sizes = Counter()
+        bold_chars = 0
+        total = 0
+        for r in p.iter(qn('w:r')):
+            length = sum(len(t.text or '') for t in r.iterchildren(qn('w:t')))
+            if not length:
+                continue
+            size, bold = para_info[0], para_info[1]
+            rpr = r.find(qn('w:rPr'))
+            if rpr is not None:
+                rstyle = rpr.find(qn('w:rStyle'))
+                if rstyle is not None:
+                    char_info = self.char_style_info(rstyle.get(qn('w:val')))
+                    size = char_info[0] if char_info[0] is not None else size
+                    bold = char_info[1] if char_info[1] is not None else bold
+                direct_size = self._rpr_size(rpr)
+                direct_bold = _on_off(rpr.find(qn('w:b')))
+                size = direct_size if direct_size is not None else size
+                bold = direct_bold if direct_bold is not None else bold
+            sizes[size] += length
+            bold_chars += length if bold else 0
+            total += length
+        
+        if not total:
+            return para_info
+        return (sizes.most_common(1)[0][0], bold_chars * 2 > total, para_info[2], para_info[3])
 
 
 class DocumentFormatter:
     """Format documents according to defined style rules."""
     
-    def __init__(self, style_config: Dict[str, Any] = None):
-        """Initialize with style configuration."""
+    def __init__(
+        self,
+        style_config: Dict[str, Any] = None,
+        deterministic: bool = False,
+        clock: Callable[[], datetime] = None,
+        compact: bool = False,
+        normalize: bool = True,
+    ):
+        """Initialize with style configuration.
+        
+        In deterministic mode identical inputs produce byte-identical
+        output; clock supplies the document timestamps. With compact, saved
+        documents go through the compaction pass and bytes saved are
+        totalled in compaction_stats. With normalize, fragmented runs in
+        input documents are merged before they are classified.
+        """
         self.config = style_config or self.get_default_style()
         self.first_para_after_title = False
+        self.deterministic = deterministic
+        self.clock = clock
+        self.compact = compact
+        self.compaction_stats = CompactionStats()
+        self.normalize = normalize
     
     def get_default_style(self) -> Dict[str, Any]:
         """Get default Chinese document style (GB/T 9704-2012)."""
@@ -124,7 +286,7 @@ class DocumentFormatter:
         if 'first_line_indent' in style_config:
             para.paragraph_format.first_line_indent = Cm(style_config['first_line_indent'] * 0.5)
     
-    def detect_paragraph_type(self, para: Document.paragraphs) -> str:
+    def detect_paragraph_type(self, para: Paragraph) -> str:
         """Detect the type of paragraph based on its style and content."""
         # Check style name
         style_name = para.style.name if para.style else ""
@@ -149,17 +311,88 @@ class DocumentFormatter:
             return 'empty'
         
         # Chinese numbering patterns: 一、二、三... or 1、2、3...
-        if re.match(r'^[一二三四五六七八九十\d]+\s*[\.\、：:]', text):
+        if HEADING1_RE.match(text):
             return 'heading1'
-        if re.match(r'^[（\(]\s*\d+[）\)]', text):
+        if HEADING2_RE.match(text):
             return 'heading2'
         
         return 'body'
     
+    def classify_paragraphs(self, document) -> List[Tuple[Paragraph, str]]:
+        """Detect paragraph types across a whole document.
+        
+        The first pass resolves each paragraph's effective font size and
+        boldness through the style chain and builds a font-size histogram;
+        the most common size is taken as body text. The second pass ranks
+        larger sizes of paragraphs not typed by their style into
+        title/heading levels, falling back to heading
+        styles and numbering patterns, then to short bold paragraphs at body
+        size, which rank one level below the size-based headings.
+        """
+        resolver = StyleResolver(document)
+        
+        # Pass 1: resolve fonts and build the size histogram
+        entries = []
+        histogram = Counter()
+        # Paragraphs per size, among those not already typed by their style
+        paragraphs_per_size = Counter()
+        has_title = False
+        for para in document.paragraphs:
+            text = para.text.strip()
+            if not text:
+                entries.append((para, text, None))
+                continue
+            info = resolver.paragraph_info(para._p)
+            entries.append((para, text, info))
+            histogram[info[0]] += len(text)
+            if info[3]:
+                has_title = True
+            elif info[2] is None:
+                paragraphs_per_size[info[0]] += 1
+        
+        body_size = histogram.most_common(1)[0][0] if histogram else None
+        larger = sorted(
+            (size for size in paragraphs_per_size if size is not None and body_size is not None and size > body_size),
+            reverse=True,
+        )
+        levels = {}
+        if not has_title and larger and paragraphs_per_size[larger[0]] <= TITLE_MAX_PARAGRAPHS:
+            levels[larger.pop(0)] = 'title'
+        for i, size in enumerate(larger):
+            levels[size] = 'heading1' if i == 0 else 'heading2'
+        bold_level = 'heading2' if 'heading1' in levels.values() else 'heading1'
+        
+        # Pass 2: assign types
+        result = []
+        for para, text, info in entries:
+            if info is None:
+                result.append((para, 'empty'))
+                continue
+            size, bold, outline, is_title = info
+            if is_title:
+                para_type = 'title'
+            elif outline is not None:
+                para_type = 'heading1' if outline == 0 else 'heading2'
+            elif size in levels:
+                para_type = levels[size]
+            elif HEADING1_RE.match(text):
+                para_type = 'heading1'
+            elif HEADING2_RE.match(text):
+                para_type = 'heading2'
+            elif bold and size == body_size and len(text) <= BOLD_HEADING_MAX_CHARS:
+                para_type = bold_level
+            else:
+                para_type = 'body'
+            result.append((para, para_type))
+        
+        return result
+    
     def format_word_document(self, input_path: str, output_path: str) -> str:
         """Read a Word document, detect styles, and reformat."""
         # Read source document
         source_doc = Document(input_path)
+        if self.normalize:
+            normalize_document(source_doc)
         
         # Create new document
         new_doc = Document()
@@ -172,22 +405,19 @@ class DocumentFormatter:
         section.left_margin = doc_config.get('margin_left', Cm(2.8))
         section.right_margin = doc_config.get('margin_right', Cm(2.6))
         
+        # Get config
+        style_map = {
+            'title': self.config.get('title', {}),
+            'heading1': self.config.get('heading1', {}),
+            'heading2': self.config.get('heading2', {}),
+            'body': self.config.get('body', {}),
+        }
+        
         # Process each paragraph
-        for para in source_doc.paragraphs:
-            text = para.text.strip()
-            if not text:
+        for para, para_type in self.classify_paragraphs(source_doc):
+            if para_type == 'empty':
                 continue
-            
-            # Detect paragraph type
-            para_type = self.detect_paragraph_type(para)
-            
-            # Get config
-            style_map = {
-                'title': self.config.get('title', {}),
-                'heading1': self.config.get('heading1', {}),
-                'heading2': self.config.get('heading2', {}),
-                'body': self.config.get('body', {}),
-            }
+            text = para.text.strip()
             
             style_config = style_map.get(para_type, self.config.get('body', {}))
             
@@ -198,14 +428,37 @@ class DocumentFormatter:
             self.apply_style_to_paragraph(new_para, style_config)
         
         # Save
-        output = Path(output_path)
-        output.parent.mkdir(parents=True, exist_ok=True)
-        new_doc.save(str(output))
+        save_document(new_doc, output_path, self.deterministic, self.clock, self.compact, self.compaction_stats)
         
         return str(output_path)
     
-    def format_document(self, content: str, output_path: str) -> str:
-        """Format content from text/markdown."""
+    def format_document(self, content: str, output_path: str, extended: bool = True) -> str:
+        """Format content from text/markdown.
+        
+        With extended=False, lists, quotes, tables and inline emphasis are
+        kept as plain text, as format_document_legacy does.
+        """
+        doc = Document()
+        
+        doc_config = self.config.get('document', {})
+        section = doc.sections[0]
+        section.top_margin = doc_config.get('margin_top', Cm(3.7))
+        section.bottom_margin = doc_config.get('margin_bottom', Cm(3.5))
+        section.left_margin = doc_config.get('margin_left', Cm(2.8))
+        section.right_margin = doc_config.get('margin_right', Cm(2.6))
+        
+        compile_markdown(content, doc, self, extended)
+        
+        save_document(doc, output_path, self.deterministic, self.clock, self.compact, self.compaction_stats)
+        
+        return str(output_path)
+    
+    def format_document_legacy(self, content: str, output_path: str) -> str:
+        """Format content from text/markdown one line at a time.
+        
+        Reference implementation of format_document, kept for output
+        comparison.
+        """
         doc = Document()
         
         doc_config = self.config.get('document', {})
@@ -292,9 +545,7 @@ class DocumentFormatter:
                     para.runs[0].font.name = "FangSong_GB2312"
                     para.runs[0].font.size = Pt(16)
         
-        output = Path(output_path)
-        output.parent.mkdir(parents=True, exist_ok=True)
-        doc.save(str(output))
+        save_document(doc, output_path, self.deterministic, self.clock, self.compact, self.compaction_stats)
         
         return str(output_path)
     
@@ -310,6 +561,168 @@ class DocumentFormatter:
             return self.format_document(content, output_path)
 
 
+class DirectoryWatcher:
+    """Watch a directory and reformat inputs that were added or changed."""
+    
+    SUPPORTED_EXTENSIONS = ('.docx', '.md', '.txt')
+    
+    def __init__(
+        self,
+        formatter: DocumentFormatter,
+        input_dir: str,
+        output_dir: str,
+        interval: float = 1.0,
+        debounce: float = 0.5,
+    ):
+        """Initialize with a warm formatter and the directories to sync."""
+        self.formatter = formatter
+        self.input_dir = Path(input_dir)
+        self.output_dir = Path(output_dir)
+        self.interval = interval
+        self.debounce = debounce
+        # relative path -> (mtime_ns, size) seen on the last poll
+        self._stats = {}
+        # relative path -> time the current stat signature was first seen
+        self._changed_at = {}
+        # relative path -> content hash of the last formatted version
+        self._hashes = {}
+        # relative paths sharing their output path with another input
+        self._conflicts = set()
+        self._started = False
+    
+    def output_for(self, rel_path: Path) -> Path:
+        """Get the output path for an input path relative to input_dir.
+        
+        Inputs differing only in extension (a.md, a.docx) share an output;
+        scan skips them while more than one exists.
+        """
+        return self.output_dir / rel_path.with_suffix('.docx')
+    
+    def _iter_inputs(self):
+        """Yield input files relative to input_dir."""
+        output_dir = self.output_dir.resolve()
+        for path in self.input_dir.rglob('*'):
+            # Skip Word lock files, hidden files and our own outputs
+            if path.name.startswith(('~$', '.')):
+                continue
+            if path.suffix.lower() not in self.SUPPORTED_EXTENSIONS:
+                continue
+            if output_dir in path.resolve().parents:
+                continue
+            if path.is_file():
+                yield path.relative_to(self.input_dir)
+    
+    @staticmethod
+    def _hash_file(path: Path) -> str:
+        """Hash file contents."""
+        digest = hashlib.sha1()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 16), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
+    
+    def scan(self) -> Dict[str, str]:
+        """Poll the input directory once and sync changed files.
+        
+        Returns a mapping of relative input path to the action taken
+        ('formatted', 'removed' or 'error').
+        """
+        now = time.monotonic()
+        actions = {}
+        current = {}
+        
+        for rel in self._iter_inputs():
+            try:
+                st = (self.input_dir / rel).stat()
+            except OSError:
+                continue
+            current[rel] = (st.st_mtime_ns, st.st_size)
+        
+        owners = {}
+        for rel in current:
+            owners.setdefault(self.output_for(rel), []).append(rel)
+        conflicts = {rel for rels in owners.values() if len(rels) > 1 for rel in rels}
+        
+        # Deleted inputs - remove their outputs, unless another input maps to them
+        for rel in set(self._stats) - set(current):
+            self._changed_at.pop(rel, None)
+            if self._hashes.pop(rel, None) is not None:
+                output = self.output_for(rel)
+                if output not in owners and output.exists():
+                    output.unlink()
+                actions[str(rel)] = 'removed'
+        
+        # Inputs no longer in conflict - format them again once stable
+        for rel in (self._conflicts - conflicts) & set(current):
+            self._hashes.pop(rel, None)
+            self._changed_at[rel] = now
+        
+        for rel, signature in current.items():
+            if rel in conflicts:
+                if rel not in self._conflicts:
+                    others = ', '.join(str(o) for o in owners[self.output_for(rel)] if o != rel)
+                    print(f"Error: {rel}: same output as {others}; skipped until renamed")
+                    actions[str(rel)] = 'error'
+                continue
+            if self._stats.get(rel) != signature:
+                # Still being written - wait until it has been stable for debounce
+                self._changed_at[rel] = now
+                if not self._started:
+                    self._seed(rel)
+                continue
+            changed_at = self._changed_at.get(rel)
+            if changed_at is None or now - changed_at < self.debounce:
+                continue
+            del self._changed_at[rel]
+            
+            action = self._sync(rel)
+            if action:
+                actions[str(rel)] = action
+        
+        self._stats = current
+        self._conflicts = conflicts
+        self._started = True
+        return actions
+    
+    def _seed(self, rel: Path):
+        """Skip reformatting on startup if the output is already up to date."""
+        source = self.input_dir / rel
+        output = self.output_for(rel)
+        if output.exists() and output.stat().st_mtime_ns >= source.stat().st_mtime_ns:
+            self._hashes[rel] = self._hash_file(source)
+            self._changed_at.pop(rel, None)
+    
+    def _sync(self, rel: Path) -> Optional[str]:
+        """Reformat a single input if its content changed."""
+        source = self.input_dir / rel
+        try:
+            digest = self._hash_file(source)
+        except OSError:
+            return None
+        if self._hashes.get(rel) == digest:
+            return None
+        # Record the hash up front so a broken input is not retried until it changes
+        self._hashes[rel] = digest
+        
+        try:
+            self.formatter.format_from_file(str(source), str(self.output_for(rel)))
+        except Exception as e:
+            print(f"Error: {rel}: {e}")
+            return 'error'
+        return 'formatted'
+    
+    def run(self):
+        """Poll until interrupted."""
+        print(f"[DocGen] Watching {self.input_dir} -> {self.output_dir} (Ctrl+C to stop)")
+        try:
+            while True:
+                for rel, action in sorted(self.scan().items()):
+                    print(f"  {action}: {rel}")
+                time.sleep(self.interval)
+        except KeyboardInterrupt:
+            print("[DocGen] Watch stopped.")
+
+
 def main():
     """CLI interface."""
     import argparse
@@ -317,11 +730,17 @@ def main():
     parser = argparse.ArgumentParser(
         description='DocGen - Format Word documents with professional styles'
     )
-    parser.add_argument('input', nargs='?', help='Input file (.docx, .md, .txt)')
-    parser.add_argument('-o', '--output', default='output.docx', help='Output filename')
+    parser.add_argument('input', nargs='?', help='Input file (.docx, .md, .txt), or directory with --watch')
+    parser.add_argument('-o', '--output', help='Output filename, or output directory with --watch')
     parser.add_argument('-c', '--config', help='Style config JSON file')
     parser.add_argument('-l', '--list', action='store_true', help='Show available styles')
     parser.add_argument('--preview', action='store_true', help='Preview style settings')
+    parser.add_argument('--watch', action='store_true', help='Watch input directory and reformat changed files')
+    parser.add_argument('--interval', type=float, default=1.0, help='Polling interval in seconds for --watch')
+    parser.add_argument('--deterministic', action='store_true',
+                        help='Produce byte-identical output for identical input')
+    parser.add_argument('--compact', action='store_true',
+                        help='Strip editing noise and unused styles/media from the output')
     
     args = parser.parse_args()
     
@@ -347,13 +766,28 @@ def main():
         with open(args.config, 'r', encoding='utf-8') as f:
             config = json.load(f)
     
-    formatter = DocumentFormatter(config)
+    formatter = DocumentFormatter(config, deterministic=args.deterministic, compact=args.compact)
+    
+    if args.watch:
+        if not os.path.isdir(args.input):
+            print(f"Error: not a directory: {args.input}")
+            return
+        watcher = DirectoryWatcher(
+            formatter,
+            args.input,
+            args.output or os.path.join(args.input, 'formatted'),
+            interval=args.interval,
+        )
+        watcher.run()
+        return
     
     try:
-        output_path = formatter.format_from_file(args.input, args.output)
+        output_path = formatter.format_from_file(args.input, args.output or 'output.docx')
         print("[DocGen] Document formatted successfully!")
         print(f"  Input:  {args.input}")
         print(f"  Output: {output_path}")
+        if args.compact:
+            print(f"  {formatter.compaction_stats.summary()}")
     except Exception as e:
         print(f"Error: {e}")
 
@@ -7,22 +7,74 @@ Select templates, customize styles, and format documents easily.
 
 import json
 import os
+import queue
+import threading
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
 from pathlib import Path
 
 
+# Paragraphs shown in the preview pane (roughly the first few pages)
+PREVIEW_PARAGRAPHS = 120
+# Delay before applying style changes to the preview, in milliseconds
+PREVIEW_DEBOUNCE_MS = 150
+# Preview font size relative to the document font size
+PREVIEW_SCALE = 0.8
+PREVIEW_ELEMENTS = ("title", "heading1", "heading2", "body", "signature")
+
+
+def load_preview_paragraphs(input_file: str, limit: int = PREVIEW_PARAGRAPHS) -> list:
+    """Read the first paragraphs of an input file as (element, text) pairs."""
+    if input_file.lower().endswith('.docx'):
+        from docx import Document
+        from doc_formatter import DocumentFormatter
+        
+        doc = Document(input_file)
+        paragraphs = []
+        for para, para_type in DocumentFormatter().classify_paragraphs(doc):
+            if para_type == 'empty':
+                continue
+            paragraphs.append((para_type, para.text.strip()))
+            if len(paragraphs) >= limit:
+                break
+        return paragraphs
+    
+    from markdown_compiler import tokenize
+    
+    with open(input_file, 'r', encoding='utf-8') as f:
+        content = f.read()
+    element_map = {"title": "title", "heading1": "heading1", "heading2": "heading2",
+                   "signature": "signature", "signature_first": "signature"}
+    paragraphs = []
+    for block in tokenize(content):
+        if block.kind == 'table':
+            for row in block.rows:
+                paragraphs.append(("body", "\t".join("".join(s.text for s in cell) for cell in row)))
+        else:
+            paragraphs.append((element_map.get(block.kind, "body"), "".join(s.text for s in block.spans)))
+        if len(paragraphs) >= limit:
+            break
+    return paragraphs[:limit]
+
+
 class DocGenGUI:
     """GUI for Document Formatter."""
     
     def __init__(self, root):
         self.root = root
         self.root.title("DocGen - Document Formatter")
-        self.root.geometry("800x700")
+        self.root.geometry("1280x760")
         
         self.style_config = self.get_default_style()
         self.input_file = None
         
+        # Preview state: input is parsed on a worker thread and handed back
+        # through a queue; style changes are collected and applied debounced
+        self.preview_results = queue.Queue()
+        self.preview_generation = 0
+        self.preview_pending = set()
+        self.preview_after_id = None
+        
         # GUI state variables
         self.font_combos = {}
         self.bold_vars = {}
@@ -50,8 +102,16 @@ class DocGenGUI:
     def setup_ui(self):
         """Setup the user interface."""
         # Main frame
-        main_frame = ttk.Frame(self.root, padding="10")
-        main_frame.pack(fill=tk.BOTH, expand=True)
+        outer_frame = ttk.Frame(self.root, padding="10")
+        outer_frame.pack(fill=tk.BOTH, expand=True)
+        
+        main_frame = ttk.Frame(outer_frame)
+        main_frame.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        
+        # Preview pane
+        preview_frame = ttk.LabelFrame(outer_frame, text="Preview", padding="10")
+        preview_frame.pack(side=tk.RIGHT, fill=tk.BOTH, expand=True, padx=(10, 0))
+        self.setup_preview(preview_frame)
         
         # Title
         title_label = ttk.Label(main_frame, text="DocGen - Document Formatter", font=('Microsoft YaHei', 18, 'bold'))
@@ -128,6 +188,94 @@ class DocGenGUI:
         status_bar = ttk.Label(self.root, textvariable=self.status_var, relief=tk.SUNKEN)
         status_bar.pack(fill=tk.X, side=tk.BOTTOM)
     
+    def setup_preview(self, parent):
+        """Setup the live preview pane."""
+        scrollbar = ttk.Scrollbar(parent, orient=tk.VERTICAL)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        
+        self.preview_text = tk.Text(parent, wrap=tk.WORD, width=60, background="white",
+                                    yscrollcommand=scrollbar.set, padx=20, pady=20)
+        self.preview_text.pack(fill=tk.BOTH, expand=True)
+        scrollbar.config(command=self.preview_text.yview)
+        
+        # One tag per element type: a style change only reconfigures that
+        # tag, so Tk re-lays out just the paragraphs of that type
+        for element in PREVIEW_ELEMENTS:
+            self.apply_preview_style(element)
+        self.preview_text.insert(tk.END, "Select a file to preview it here.", "body")
+        self.preview_text.config(state=tk.DISABLED)
+    
+    def apply_preview_style(self, element):
+        """Configure the preview tag of an element from the style config."""
+        doc_config = self.style_config.get("document", {})
+        config = self.style_config.get(element, {})
+        size = config.get("font_size", doc_config.get("font_size", 16))
+        font_size = max(6, round(size * PREVIEW_SCALE))
+        weight = "bold" if config.get("bold") else "normal"
+        justify = {"center": tk.CENTER, "right": tk.RIGHT}.get(config.get("alignment"), tk.LEFT)
+        indent = config.get("first_line_indent", 0) * font_size
+        line_gap = round(font_size * (config.get("line_spacing", doc_config.get("line_spacing", 1.5)) - 1))
+        
+        self.preview_text.tag_configure(
+            element,
+            font=(config.get("font_family", doc_config.get("font_family", "SimSun")), font_size, weight),
+            justify=justify,
+            lmargin1=indent,
+            spacing1=config.get("spacing_before", 0) // 20,
+            spacing2=line_gap,
+            spacing3=max(line_gap, config.get("spacing_after", 0) // 20),
+        )
+    
+    def schedule_preview_update(self, *elements):
+        """Restyle the preview for changed elements after a short pause."""
+        self.preview_pending.update(elements or PREVIEW_ELEMENTS)
+        if self.preview_after_id is not None:
+            self.root.after_cancel(self.preview_after_id)
+        self.preview_after_id = self.root.after(PREVIEW_DEBOUNCE_MS, self.flush_preview_update)
+    
+    def flush_preview_update(self):
+        """Apply pending style changes to the preview."""
+        self.preview_after_id = None
+        pending, self.preview_pending = self.preview_pending, set()
+        for element in pending:
+            self.apply_preview_style(element)
+    
+    def load_preview(self):
+        """Parse the selected input on a worker thread."""
+        self.preview_generation += 1
+        generation = self.preview_generation
+        input_file = self.input_file
+        
+        def work():
+            try:
+                result = load_preview_paragraphs(input_file)
+            except Exception as e:
+                result = e
+            self.preview_results.put((generation, result))
+        
+        threading.Thread(target=work, daemon=True).start()
+        self.root.after(50, self.poll_preview)
+    
+    def poll_preview(self):
+        """Show parsed input once the worker thread is done."""
+        try:
+            generation, result = self.preview_results.get_nowait()
+        except queue.Empty:
+            self.root.after(50, self.poll_preview)
+            return
+        if generation != self.preview_generation:
+            # A newer file was selected meanwhile
+            return
+        
+        self.preview_text.config(state=tk.NORMAL)
+        self.preview_text.delete("1.0", tk.END)
+        if isinstance(result, Exception):
+            self.preview_text.insert(tk.END, f"Preview failed: {result}", "body")
+        else:
+            for element, text in result:
+                self.preview_text.insert(tk.END, text + "\n", element)
+        self.preview_text.config(state=tk.DISABLED)
+    
     def setup_document_tab(self, parent):
         """Setup document settings tab."""
         grid = ttk.Frame(parent)
@@ -154,7 +302,8 @@ class DocGenGUI:
         self.font_size_combo = ttk.Combobox(grid, values=sizes, width=6, state="readonly")
         self.font_size_combo.set("16")
         self.font_size_combo.grid(row=row, column=1, padx=5)
-        self.font_size_combo.bind("<<ComboboxSelected>>", lambda e: self.update_style('document', 'font_size', 16))
+        self.font_size_combo.bind("<<ComboboxSelected>>",
+                                  lambda e: self.update_style('document', 'font_size', int(self.font_size_combo.get())))
         
         row += 1
         ttk.Label(grid, text="Line Spacing:").grid(row=row, column=0, sticky=tk.W, pady=5)
@@ -247,35 +396,41 @@ class DocGenGUI:
         self.style_config[element][key] = value
         self.template_var.set("custom")
         self.status_var.set(f"{element}.{key} = {value}")
+        self.schedule_preview_update(*(() if element == "document" else (element,)))
     
     def update_font(self, element):
         """Update font family for element."""
         font = self.font_combos[element]['family'].get()
         self.style_config[element]["font_family"] = font
         self.template_var.set("custom")
+        self.schedule_preview_update(element)
     
     def update_size(self, element):
         """Update font size for element."""
         size = int(self.font_combos[element]['size'].get())
         self.style_config[element]["font_size"] = size
         self.template_var.set("custom")
+        self.schedule_preview_update(element)
     
     def update_bold(self, element):
         """Update bold setting for element."""
         bold = self.bold_vars[element].get()
         self.style_config[element]["bold"] = bold
         self.template_var.set("custom")
+        self.schedule_preview_update(element)
     
     def update_alignment(self, element):
         """Update alignment for element."""
         align = self.align_vars[element].get()
         self.style_config[element]["alignment"] = align
         self.template_var.set("custom")
+        self.schedule_preview_update(element)
     
     def update_indent(self):
         """Update first line indent."""
         self.style_config["body"]["first_line_indent"] = 2 if self.indent_var.get() else 0
         self.template_var.set("custom")
+        self.schedule_preview_update("body")
     
     def select_file(self):
         """Select input file."""
@@ -285,6 +440,7 @@ class DocGenGUI:
             self.input_file = filename
             self.file_label.config(text=Path(filename).name, foreground="black")
             self.status_var.set(f"Selected: {filename}")
+            self.load_preview()
     
     def preview_config(self):
         """Preview current style configuration."""
@@ -334,6 +490,7 @@ class DocGenGUI:
         self.style_config = self.get_default_style()
         self.template_var.set("default")
         self.status_var.set("Reset to default styles")
+        self.schedule_preview_update()
         messagebox.showinfo("Reset", "Default styles restored")
     
     def apply_formal_style(self):
@@ -348,6 +505,7 @@ class DocGenGUI:
             "signature": {"font_family": "SimSun", "font_size": 14, "bold": False, "alignment": "right"}
         }
         self.status_var.set("Applied: Formal Business Letter style")
+        self.schedule_preview_update()
     
     def apply_academic_style(self):
         """Apply academic paper style."""
@@ -361,6 +519,7 @@ class DocGenGUI:
             "signature": {"font_family": "SimSun", "font_size": 12, "bold": False, "alignment": "right"}
         }
         self.status_var.set("Applied: Academic Paper style")
+        self.schedule_preview_update()
 
 
 def main():
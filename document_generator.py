@@ -5,30 +5,412 @@ DocGen - Document Generator
 Generate professional DOCX documents from Word templates.
 """
 
+import copy
+import functools
+import io
 import os
+import re
 import sys
+import threading
+from collections import ChainMap, OrderedDict
 from datetime import datetime
 from pathlib import Path
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Callable, NamedTuple, Optional, Tuple
 from docx import Document
+from docx.opc.constants import RELATIONSHIP_TYPE as RT
+from docx.opc.oxml import serialize_part_xml
+from docx.oxml.ns import qn
 from docx.shared import Pt
 from docx.enum.text import WD_ALIGN_PARAGRAPH
+from lxml import etree
+
+from docx_compact import STYLE_LINK_TAGS, STYLE_REF_TAGS, CompactionStats, compact_package
+from docx_io import FIXED_TIMESTAMP, append_member, read_package, save_document, set_timestamps, write_package
+from docx_normalize import normalize_document
+from template_filters import FILTERS, PURE_FILTERS
+
+
+# Composition markers, each on a paragraph of its own:
+#   {{> name}}   include the body of partial template `name`
+#   {{< name}}   (first paragraph) this template extends base template `name`
+#   {{$block}} ... {{/block}}   overridable block in a base template, or an
+#                                override of that block in a child template
+INCLUDE_RE = re.compile(r'^\{\{>\s*([\w\-/]+)\s*\}\}$')
+EXTENDS_RE = re.compile(r'^\{\{<\s*([\w\-/]+)\s*\}\}$')
+BLOCK_OPEN_RE = re.compile(r'^\{\{\$\s*(\w+)\s*\}\}$')
+BLOCK_CLOSE_RE = re.compile(r'^\{\{/\s*(\w+)\s*\}\}$')
+
+# Variable placeholders: {{key}}, {{ key }}, {{key|filter|filter:arg}}
+PLACEHOLDER_RE = re.compile(r'\{\{\s*([^\s{}|#/>$<!^][^\s{}|]*)\s*((?:\|[^|{}]+)*)\}\}')
+
+# Memoized results kept per pure filter
+FILTER_CACHE_SIZE = 4096
+
+# Render sessions kept per generator, least recently used dropped first
+MAX_SESSIONS = 64
+
+
+class Placeholder(NamedTuple):
+    """A parsed {{key|filter:arg}} placeholder."""
+    raw: str
+    key: str
+    filters: Tuple[Tuple[str, Optional[str]], ...]
+
+
+# Conditional sections, each marker on a paragraph (or table row) of its own:
+#   {{#if key}} ... {{else}} ... {{/if}}
+#   {{#unless key}} ... {{/unless}}
+CONDITION_OPEN_RE = re.compile(r'^\{\{#(if|unless)\s+([^\s{}]+)\s*\}\}$')
+CONDITION_ELSE_RE = re.compile(r'^\{\{else\}\}$')
+CONDITION_CLOSE_RE = re.compile(r'^\{\{/(if|unless)\}\}$')
+
+# String values that count as false in conditions (e.g. from -v key=false)
+FALSE_STRINGS = ('', '0', 'false', 'no', 'off')
+
+
+class ElementNode(NamedTuple):
+    """Template content copied as is; runs lists (path, segments) of the
+    runs holding placeholders, path being child indexes from the element."""
+    element: Any
+    runs: tuple = ()
+
+
+class ContainerNode(NamedTuple):
+    """Element whose children are conditional, e.g. a table with
+    conditional rows; element is the shell without those children."""
+    element: Any
+    children: tuple
+
+
+class ConditionNode(NamedTuple):
+    """{{#if key}} / {{#unless key}} section."""
+    key: str
+    negate: bool
+    then_nodes: tuple
+    else_nodes: tuple
+
+
+class CompiledTemplate:
+    """A loaded template with its conditions and placeholders parsed.
+    
+    document is the template with an empty body (apart from section
+    properties); nodes describe the body content, so rendering only copies
+    and substitutes the branches that are actually emitted. parts lists
+    (part name, runs) for the header and footer parts holding placeholders.
+    """
+    
+    def __init__(self, name: str, document: Document, nodes: tuple, parts: tuple = ()):
+        self.name = name
+        self.document = document
+        self.nodes = nodes
+        self.parts = parts
+
+
+class RenderSession:
+    """Last rendered state of a template, for delta re-renders.
+    
+    emitted lists (node, element, keys) for every rendered element holding
+    placeholders; condition_keys are the keys that need a full render: those
+    of the conditions evaluated and of the placeholders in headers and
+    footers; base_package is the saved package without the main document part.
+    """
+    
+    def __init__(self, compiled: 'CompiledTemplate'):
+        self.compiled = compiled
+        self.lock = threading.Lock()
+        self.variables = None
+        self.doc = None
+        self.emitted = []
+        self.condition_keys = set()
+        self.base_package = None
+
+
+def parse_placeholders(text: str) -> tuple:
+    """Split text into literal strings and Placeholders."""
+    segments = []
+    pos = 0
+    for match in PLACEHOLDER_RE.finditer(text):
+        if match.start() > pos:
+            segments.append(text[pos:match.start()])
+        filters = []
+        for part in match.group(2).split('|')[1:]:
+            name, sep, arg = part.partition(':')
+            filters.append((name.strip(), arg if sep else None))
+        segments.append(Placeholder(match.group(0), match.group(1), tuple(filters)))
+        pos = match.end()
+    if pos < len(text):
+        segments.append(text[pos:])
+    return tuple(segments)
+
+
+def _paragraph_text(p) -> str:
+    """Get the stripped text of a w:p element."""
+    return ''.join(t.text or '' for t in p.iter(qn('w:t'))).strip()
+
+
+def _child_path(root, el) -> tuple:
+    """Get the child indexes leading from root down to el."""
+    path = []
+    while el is not root:
+        parent = el.getparent()
+        path.append(parent.index(el))
+        el = parent
+    return tuple(reversed(path))
+
+
+def _header_footer_parts(doc) -> list:
+    """Get the header and footer parts of a document."""
+    return [
+        rel.target_part for rel in doc.part.rels.values()
+        if rel.reltype in (RT.HEADER, RT.FOOTER)
+    ]
+
+
+def _find_blocks(body) -> Dict[str, tuple]:
+    """Find {{$name}} ... {{/name}} blocks among the direct children of body.
+    
+    Returns name -> (open marker, content elements, close marker). Blocks do
+    not nest.
+    """
+    blocks = {}
+    open_name, open_el, content = None, None, []
+    for child in body.iterchildren():
+        text = _paragraph_text(child) if child.tag == qn('w:p') else ''
+        if open_name is None:
+            match = BLOCK_OPEN_RE.match(text)
+            if match:
+                open_name, open_el, content = match.group(1), child, []
+            continue
+        match = BLOCK_CLOSE_RE.match(text)
+        if match and match.group(1) == open_name:
+            blocks[open_name] = (open_el, content, child)
+            open_name = None
+        else:
+            content.append(child)
+    if open_name is not None:
+        raise ValueError(f"Unclosed template block: {{{{${open_name}}}}}")
+    return blocks
+
+
+# Attributes holding relationship ids (r:id, r:embed, r:link, ... and VML o:relid)
+R_NS = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}'
+O_RELID = '{urn:schemas-microsoft-com:office:office}relid'
+# References into parts that spliced content cannot carry along
+UNSUPPORTED_REFS = {
+    qn('w:footnoteReference'): 'footnotes',
+    qn('w:endnoteReference'): 'endnotes',
+    qn('w:commentReference'): 'comments',
+}
+
+
+class _ContentImporter:
+    """Make body elements taken from one template package valid in another.
+    
+    Relationship ids are re-created against the target part (images are
+    added to the target package, external links re-linked), numbering
+    definitions are copied with fresh ids unless an identical one exists,
+    and styles missing from the target are copied with their base styles.
+    Styles the target already defines keep the target's definition.
+    """
+    
+    def __init__(self, target: Document):
+        self.target = target
+        # (source numbering element, source numId) -> target numId
+        self._num_ids = {}
+    
+    def import_elements(self, elements: list, source: Document, source_name: str):
+        """Rewrite elements from source, in place, for use in the target."""
+        self._import_relationships(elements, source.part, source_name)
+        while elements:
+            style_ids = self._import_numbering(elements, source, source_name)
+            style_ids |= {el.get(qn('w:val')) for root in elements for el in root.iter(*STYLE_REF_TAGS)}
+            # Copied styles may reference numbering and further styles in turn
+            elements = self._import_styles(style_ids, source)
+    
+    def _import_relationships(self, elements: list, source_part, source_name: str):
+        """Re-create the relationships referenced by elements in the target part."""
+        rids = {}
+        for root in elements:
+            for el in root.iter():
+                if not isinstance(el.tag, str):
+                    continue
+                if el.tag in UNSUPPORTED_REFS:
+                    raise ValueError(
+                        f"Template {source_name}: {UNSUPPORTED_REFS[el.tag]} cannot be spliced into another template"
+                    )
+                for attr, value in el.attrib.items():
+                    if attr.startswith(R_NS) or attr == O_RELID:
+                        if value not in rids:
+                            rids[value] = self._import_relationship(source_part, value, source_name)
+                        el.set(attr, rids[value])
+    
+    def _import_relationship(self, source_part, rid: str, source_name: str) -> str:
+        """Re-create one relationship in the target part and return its id."""
+        rel = source_part.rels.get(rid)
+        if rel is None:
+            raise ValueError(f"Template {source_name}: relationship {rid} not found")
+        target_part = self.target.part
+        if rel.is_external:
+            return target_part.relate_to(rel.target_ref, rel.reltype, is_external=True)
+        if rel.reltype == RT.IMAGE:
+            new_rid, _ = target_part.get_or_add_image(io.BytesIO(rel.target_part.blob))
+            return new_rid
+        kind = rel.reltype.rsplit('/', 1)[-1]
+        raise ValueError(f"Template {source_name}: {kind} content cannot be spliced into another template")
+    
+    def _import_numbering(self, elements: list, source: Document, source_name: str) -> set:
+        """Point list paragraphs at numbering definitions in the target.
+        
+        Returns the style ids the copied definitions link to.
+        """
+        refs = [
+            el for root in elements for el in root.iter(qn('w:numId'))
+            if el.getparent().tag == qn('w:numPr') and el.get(qn('w:val')) not in (None, '0')
+        ]
+        if not refs:
+            return set()
+        try:
+            source_numbering = source.part.part_related_by(RT.NUMBERING).element
+        except KeyError:
+            raise ValueError(f"Template {source_name}: list numbering definitions are missing")
+        target_numbering = self.target.part.numbering_part.element
+        
+        style_ids = set()
+        for ref in refs:
+            key = (source_numbering, ref.get(qn('w:val')))
+            if key not in self._num_ids:
+                self._num_ids[key] = self._import_num(source_numbering, target_numbering, key[1], style_ids, source_name)
+            ref.set(qn('w:val'), self._num_ids[key])
+        return style_ids
+    
+    @staticmethod
+    def _import_num(source_numbering, target_numbering, num_id: str, style_ids: set, source_name: str) -> str:
+        """Copy a w:num and its w:abstractNum into the target; return the new numId."""
+        def find(numbering, tag, attr, value):
+            return next((el for el in numbering.iterchildren(qn(tag)) if el.get(qn(attr)) == value), None)
+        
+        num = find(source_numbering, 'w:num', 'w:numId', num_id)
+        if num is None:
+            raise ValueError(f"Template {source_name}: list numbering {num_id} not found")
+        abstract_id = num.find(qn('w:abstractNumId')).get(qn('w:val'))
+        abstract = find(source_numbering, 'w:abstractNum', 'w:abstractNumId', abstract_id)
+        
+        # Reuse an identical definition, e.g. from the same default template
+        target_num = find(target_numbering, 'w:num', 'w:numId', num_id)
+        target_abstract = find(target_numbering, 'w:abstractNum', 'w:abstractNumId', abstract_id)
+        if target_num is not None and target_abstract is not None:
+            if (etree.tostring(num, method='c14n') == etree.tostring(target_num, method='c14n')
+                    and etree.tostring(abstract, method='c14n') == etree.tostring(target_abstract, method='c14n')):
+                return num_id
+        
+        abstracts = list(target_numbering.iterchildren(qn('w:abstractNum')))
+        nums = list(target_numbering.iterchildren(qn('w:num')))
+        new_abstract_id = str(max((int(el.get(qn('w:abstractNumId'))) for el in abstracts), default=-1) + 1)
+        new_num_id = str(max((int(el.get(qn('w:numId'))) for el in nums), default=0) + 1)
+        
+        if abstract is not None:
+            abstract = copy.deepcopy(abstract)
+            abstract.set(qn('w:abstractNumId'), new_abstract_id)
+            style_ids.update(el.get(qn('w:val')) for el in abstract.iter(*STYLE_REF_TAGS))
+            # abstractNum elements precede num elements
+            if abstracts:
+                abstracts[-1].addnext(abstract)
+            elif nums:
+                nums[0].addprevious(abstract)
+            else:
+                target_numbering.append(abstract)
+        num = copy.deepcopy(num)
+        num.set(qn('w:numId'), new_num_id)
+        num.find(qn('w:abstractNumId')).set(qn('w:val'), new_abstract_id)
+        if nums:
+            nums[-1].addnext(num)
+        else:
+            cleanup = target_numbering.find(qn('w:numIdMacAtCleanup'))
+            if cleanup is not None:
+                cleanup.addprevious(num)
+            else:
+                target_numbering.append(num)
+        return new_num_id
+    
+    def _import_styles(self, style_ids: set, source: Document) -> list:
+        """Copy styles the target lacks, with the styles they build on.
+        
+        Returns the copied style elements.
+        """
+        target_styles = self.target.styles.element
+        existing = {el.get(qn('w:styleId')) for el in target_styles.iterchildren(qn('w:style'))}
+        pending = [sid for sid in style_ids if sid not in existing]
+        if not pending:
+            return []
+        source_styles = {el.get(qn('w:styleId')): el for el in source.styles.element.iterchildren(qn('w:style'))}
+        
+        copied = []
+        while pending:
+            sid = pending.pop()
+            if sid in existing or sid not in source_styles:
+                continue
+            style = copy.deepcopy(source_styles[sid])
+            target_styles.append(style)
+            existing.add(sid)
+            copied.append(style)
+            pending.extend(link.get(qn('w:val')) for link in style.iterchildren(*STYLE_LINK_TAGS))
+        return copied
+
+
+def _sources_current(sources: dict) -> bool:
+    """Check that template source files are unchanged since they were read."""
+    try:
+        return all(os.stat(path).st_mtime_ns == mtime for path, mtime in sources.items())
+    except OSError:
+        return False
+
+
+def _strip_block_markers(body):
+    """Remove {{$name}} / {{/name}} marker paragraphs, keeping block content."""
+    for open_el, content, close_el in _find_blocks(body).values():
+        body.remove(open_el)
+        body.remove(close_el)
 
 
 class DocumentGenerator:
     """Generate DOCX documents from Word templates."""
     
-    def __init__(self, template_dir: str = None):
-        """Initialize with template directory."""
+    def __init__(
+        self,
+        template_dir: str = None,
+        deterministic: bool = False,
+        clock: Callable[[], datetime] = None,
+        compact: bool = False,
+        normalize: bool = True,
+    ):
+        """Initialize with template directory.
+        
+        In deterministic mode identical inputs produce byte-identical
+        output. clock supplies the default date and, in deterministic mode,
+        the document timestamps; deterministic mode without a clock uses the
+        fixed timestamp for both. With compact, saved documents go through
+        the compaction pass and bytes saved are totalled in compaction_stats.
+        With normalize, fragmented runs in templates are merged as they are
+        parsed, so placeholders split by Word are found whole.
+        """
         if template_dir is None:
             # Default to templates folder relative to this script
             script_dir = Path(__file__).parent
             template_dir = str(script_dir / "templates")
         self.template_dir = Path(template_dir)
+        self.deterministic = deterministic
+        self.clock = clock
+        self.compact = compact
+        self.compaction_stats = CompactionStats()
+        self.normalize = normalize
+        if clock:
+            today = clock()
+        else:
+            today = FIXED_TIMESTAMP if deterministic else datetime.now()
         self.default_vars = {
             "title": "文章标题",
             "author": "作者姓名",
-            "date": datetime.now().strftime("%Y-%m-%d"),
+            "date": today.strftime("%Y-%m-%d"),
             "introduction": "引言/开篇内容...",
             "heading1": "一级标题",
             "heading2": "二级标题",
@@ -37,21 +419,164 @@ class DocumentGenerator:
             "conclusion": "结论/总结...",
             "signature": "落款（签名、日期）",
         }
+        # Parsed templates by name, as (document, {source path: mtime_ns});
+        # load_template hands out copies. Entries whose sources changed on
+        # disk are parsed again.
+        self._template_cache = {}
+        # Body elements of partial templates by name, spliced in by {{> name}},
+        # as (elements, document, sources)
+        self._fragment_cache = {}
+        # Compiled templates by name, as (parsed template, compiled)
+        self._compiled_cache = {}
+        # Filters registered on this generator, over the live global registry
+        self.filters = ChainMap({}, FILTERS)
+        # Names of this generator's own filters that are pure
+        self._pure_filters = set()
+        # name -> (filter, memoized or plain callable used for it)
+        self._memoized_filters = {}
+        # Render sessions by key, for generate_session
+        self._sessions = OrderedDict()
+        self._sessions_lock = threading.Lock()
+    
+    def register_filter(self, name: str, func: Callable, pure: bool = True):
+        """Register a filter for this generator, taking precedence over a
+        global filter of the same name."""
+        self.filters[name] = func
+        if pure:
+            self._pure_filters.add(name)
+        else:
+            self._pure_filters.discard(name)
     
     def load_template(self, template_name: str) -> Document:
         """Load a Word template file."""
-        # Search in all subdirectories
+        return copy.deepcopy(self._cached_template(template_name))
+    
+    def _cached_template(self, template_name: str) -> Document:
+        """Get the shared parsed template, parsing it on first use or after
+        any of its source files changed."""
+        cached = self._template_cache.get(template_name)
+        if cached is None or not _sources_current(cached[1]):
+            cached = self._template_cache[template_name] = self._parse_template(template_name)
+        return cached[0]
+    
+    def clear_cache(self):
+        """Forget all parsed and compiled templates."""
+        self._template_cache.clear()
+        self._fragment_cache.clear()
+        self._compiled_cache.clear()
+    
+    def preload_templates(self) -> list:
+        """Parse and compile every template under template_dir into the cache.
+        
+        Partials are parsed only; they are compiled as part of the templates
+        including them.
+        """
+        if not self.template_dir.exists():
+            return []
+        
+        for template_path in sorted(self.template_dir.rglob('*.docx')):
+            name = template_path.stem
+            if not template_path.is_file():
+                continue
+            if template_path.relative_to(self.template_dir).parts[0] == 'partials':
+                self._cached_template(name)
+            else:
+                self.compile_template(name)
+        
+        return sorted(self._template_cache)
+    
+    def _find_template(self, template_name: str) -> Path:
+        """Find a template file in any subdirectory."""
         for template_path in self.template_dir.rglob(f"{template_name}.docx"):
             if template_path.is_file():
-                return Document(template_path)
+                return template_path
         
         raise FileNotFoundError(f"Template not found: {template_name}.docx")
     
+    def _parse_template(self, template_name: str) -> tuple:
+        """Parse a template and resolve inheritance and partial includes.
+        
+        Returns (document, {source path: mtime_ns}).
+        """
+        sources = {}
+        doc = self._compose_template(template_name, (), sources)
+        _strip_block_markers(doc.element.body)
+        return doc, sources
+    
+    def _compose_template(self, template_name: str, including: tuple, sources: dict) -> Document:
+        """Parse a template, applying {{< base}} and {{> partial}} markers.
+        
+        Block markers are left in place so that templates extending this one
+        can still override its blocks. Every file read is recorded in sources.
+        """
+        if template_name in including:
+            chain = ' -> '.join(including + (template_name,))
+            raise ValueError(f"Template includes itself: {chain}")
+        including = including + (template_name,)
+        
+        path = self._find_template(template_name)
+        # Stat before reading, so a write in between is caught next time
+        sources[str(path)] = path.stat().st_mtime_ns
+        doc = Document(str(path))
+        if self.normalize:
+            normalize_document(doc)
+        body = doc.element.body
+        
+        first = next((p for p in body.iterchildren(qn('w:p')) if _paragraph_text(p)), None)
+        match = EXTENDS_RE.match(_paragraph_text(first)) if first is not None else None
+        if match:
+            # Child template: only its blocks matter, the rest comes from the base
+            child = doc
+            overrides = {name: content for name, (_, content, _) in _find_blocks(body).items()}
+            doc = self._compose_template(match.group(1), including, sources)
+            importer = _ContentImporter(doc)
+            body = doc.element.body
+            for name, (open_el, content, close_el) in _find_blocks(body).items():
+                if name not in overrides:
+                    continue
+                for el in content:
+                    body.remove(el)
+                importer.import_elements(overrides[name], child, template_name)
+                for el in overrides[name]:
+                    close_el.addprevious(el)
+        else:
+            importer = _ContentImporter(doc)
+        
+        for p in list(body.iter(qn('w:p'))):
+            match = INCLUDE_RE.match(_paragraph_text(p))
+            if match:
+                fragment, fragment_doc = self._load_fragment(match.group(1), including, sources)
+                elements = [copy.deepcopy(el) for el in fragment]
+                importer.import_elements(elements, fragment_doc, match.group(1))
+                for el in elements:
+                    p.addprevious(el)
+                p.getparent().remove(p)
+        
+        return doc
+    
+    def _load_fragment(self, partial_name: str, including: tuple, sources: dict) -> tuple:
+        """Get (body elements, document) of a partial, parsing it only once per change."""
+        cached = self._fragment_cache.get(partial_name)
+        if cached is None or not _sources_current(cached[2]):
+            fragment_sources = {}
+            doc = self._compose_template(partial_name, including, fragment_sources)
+            body = doc.element.body
+            _strip_block_markers(body)
+            fragment = [el for el in body.iterchildren() if el.tag != qn('w:sectPr')]
+            cached = self._fragment_cache[partial_name] = (fragment, doc, fragment_sources)
+        sources.update(cached[2])
+        return cached[0], cached[1]
+    
     def replace_variables(self, doc: Document, variables: Dict[str, Any]) -> Document:
-        """Replace variables in the document."""
-        for paragraph in doc.paragraphs:
-            for run in paragraph.runs:
-                text = run.text
+        """Replace variables in the document.
+        
+        Reference implementation of render; placeholder filters are only
+        applied by compiled templates.
+        """
+        roots = [doc.element.body] + [part.element for part in _header_footer_parts(doc)]
+        for root in roots:
+            for run in root.iter(qn('w:r')):
+                original = text = run.text
                 for key, value in variables.items():
                     # Replace {{key}} format
                     placeholder = "{{" + key + "}}"
@@ -61,9 +586,221 @@ class DocumentGenerator:
                     placeholder_spaced = "{{ " + key + " }}"
                     if placeholder_spaced in text:
                         text = text.replace(placeholder_spaced, str(value))
-                run.text = text
+                # Rewriting unchanged runs would drop non-text content such as images
+                if text != original:
+                    run.text = text
+        return doc
+    
+    def compile_template(self, template_name: str) -> CompiledTemplate:
+        """Locate and parse the placeholders of a template, once per template
+        version on disk."""
+        template = self._cached_template(template_name)
+        cached = self._compiled_cache.get(template_name)
+        if cached is not None and cached[0] is template:
+            return cached[1]
+        
+        doc = copy.deepcopy(template)
+        body = doc.element.body
+        children = [el for el in body.iterchildren() if el.tag != qn('w:sectPr')]
+        for el in children:
+            body.remove(el)
+        
+        nodes = self._compile_nodes(template_name, children, _paragraph_text, self._compile_body_element)
+        parts = tuple(
+            (part.partname, runs) for part in _header_footer_parts(doc)
+            for runs in [self._compile_runs(template_name, part.element)] if runs
+        )
+        compiled = CompiledTemplate(template_name, doc, nodes, parts)
+        self._compiled_cache[template_name] = (template, compiled)
+        return compiled
+    
+    def _compile_nodes(self, template_name: str, elements: list, marker_text, compile_element) -> tuple:
+        """Group elements into nodes, nesting those between condition markers."""
+        # Stack of (open match, then nodes, else nodes or None)
+        stack = []
+        nodes = []
+        for el in elements:
+            text = marker_text(el)
+            match = CONDITION_OPEN_RE.match(text)
+            if match:
+                stack.append((match, nodes, None))
+                nodes = []
+                continue
+            if CONDITION_ELSE_RE.match(text):
+                if not stack or stack[-1][2] is not None:
+                    raise ValueError(f"Unexpected {{{{else}}}} in template {template_name}")
+                open_match, outer, _ = stack.pop()
+                stack.append((open_match, outer, nodes))
+                nodes = []
+                continue
+            match = CONDITION_CLOSE_RE.match(text)
+            if match:
+                if not stack or stack[-1][0].group(1) != match.group(1):
+                    raise ValueError(f"Unexpected {text} in template {template_name}")
+                open_match, outer, then_nodes = stack.pop()
+                if then_nodes is None:
+                    then_nodes, else_nodes = nodes, []
+                else:
+                    else_nodes = nodes
+                outer.append(ConditionNode(
+                    open_match.group(2), open_match.group(1) == 'unless', tuple(then_nodes), tuple(else_nodes)
+                ))
+                nodes = outer
+                continue
+            nodes.append(compile_element(template_name, el))
+        
+        if stack:
+            raise ValueError(f"Unclosed {stack[-1][0].group(0)} in template {template_name}")
+        return tuple(nodes)
+    
+    def _compile_body_element(self, template_name: str, el):
+        """Compile a body-level element into a node."""
+        if el.tag == qn('w:tbl'):
+            rows = list(el.iterchildren(qn('w:tr')))
+            if any(CONDITION_OPEN_RE.match(_paragraph_text(tr)) for tr in rows):
+                for tr in rows:
+                    el.remove(tr)
+                children = self._compile_nodes(template_name, rows, _paragraph_text, self._compile_element)
+                return ContainerNode(el, children)
+        return self._compile_element(template_name, el)
+    
+    def _compile_element(self, template_name: str, el) -> ElementNode:
+        """Compile an element copied as is, with the placeholders of all its runs."""
+        return ElementNode(el, self._compile_runs(template_name, el))
+    
+    def _compile_runs(self, template_name: str, el) -> tuple:
+        """Parse the placeholders in the runs under an element, e.g. in
+        paragraphs, table cells and hyperlinks."""
+        runs = []
+        for r in el.iter(qn('w:r')):
+            text = r.text
+            if '{{' not in text:
+                continue
+            segments = parse_placeholders(text)
+            placeholders = [s for s in segments if isinstance(s, Placeholder)]
+            for placeholder in placeholders:
+                for name, _ in placeholder.filters:
+                    if name not in self.filters:
+                        raise ValueError(f"Unknown filter '{name}' in template {template_name}: {placeholder.raw}")
+            if placeholders:
+                runs.append((_child_path(el, r), segments))
+        return tuple(runs)
+    
+    def _filter(self, name: str) -> Callable:
+        """Get a filter, memoized across renders if it is pure.
+        
+        The memo is rebuilt when the filter is registered again.
+        """
+        source = self.filters[name]
+        cached = self._memoized_filters.get(name)
+        if cached is not None and cached[0] is source:
+            return cached[1]
+        own = name in self.filters.maps[0]
+        func = source
+        if (name in self._pure_filters) if own else (name in PURE_FILTERS):
+            func = functools.lru_cache(maxsize=FILTER_CACHE_SIZE)(source)
+        self._memoized_filters[name] = (source, func)
+        return func
+    
+    def _render_placeholder(self, placeholder: Placeholder, variables: Dict[str, Any]) -> str:
+        """Get the text for a placeholder.
+        
+        Unknown keys are left as they are, unless the filter chain has a
+        default: then the chain runs on None from that filter on.
+        """
+        filters = placeholder.filters
+        if placeholder.key in variables:
+            value = variables[placeholder.key]
+        else:
+            names = [name for name, _ in filters]
+            if 'default' not in names:
+                return placeholder.raw
+            value = None
+            filters = filters[names.index('default'):]
+        for name, arg in filters:
+            args = () if arg is None else (arg,)
+            func = self._filter(name)
+            try:
+                value = func(value, *args)
+            except TypeError:
+                # Unhashable value - skip the memo
+                if not hasattr(func, '__wrapped__'):
+                    raise
+                value = func.__wrapped__(value, *args)
+        return str(value)
+    
+    @staticmethod
+    def _is_true(variables: Dict[str, Any], key: str) -> bool:
+        """Evaluate a condition key; missing keys are false."""
+        value = variables.get(key)
+        if isinstance(value, str):
+            return value.strip().lower() not in FALSE_STRINGS
+        return bool(value)
+    
+    def _render_runs(self, runs: tuple, el, variables: Dict[str, Any]):
+        """Substitute the placeholders of the compiled runs under a rendered element."""
+        for path, segments in runs:
+            r = el
+            for index in path:
+                r = r[index]
+            r.text = ''.join(
+                s if isinstance(s, str) else self._render_placeholder(s, variables) for s in segments
+            )
+    
+    def _render_nodes(
+        self,
+        nodes: tuple,
+        variables: Dict[str, Any],
+        add: Callable,
+        session: RenderSession = None,
+    ):
+        """Copy the emitted nodes, substituting placeholders, and add them.
+        
+        With a session, records what was emitted for later delta renders.
+        """
+        for node in nodes:
+            if isinstance(node, ConditionNode):
+                if session is not None:
+                    session.condition_keys.add(node.key)
+                if self._is_true(variables, node.key) != node.negate:
+                    self._render_nodes(node.then_nodes, variables, add, session)
+                else:
+                    self._render_nodes(node.else_nodes, variables, add, session)
+            elif isinstance(node, ContainerNode):
+                el = copy.deepcopy(node.element)
+                self._render_nodes(node.children, variables, el.append, session)
+                add(el)
+            else:
+                el = copy.deepcopy(node.element)
+                if node.runs:
+                    self._render_runs(node.runs, el, variables)
+                    if session is not None:
+                        keys = {s.key for _, segments in node.runs for s in segments if isinstance(s, Placeholder)}
+                        session.emitted.append((node, el, keys))
+                add(el)
+    
+    def render(self, compiled: CompiledTemplate, variables: Dict[str, Any]) -> Document:
+        """Render a compiled template into a new document."""
+        doc = copy.deepcopy(compiled.document)
+        body = doc.element.body
+        sect_pr = body.find(qn('w:sectPr'))
+        add = sect_pr.addprevious if sect_pr is not None else body.append
+        self._render_nodes(compiled.nodes, variables, add)
+        self._render_parts(compiled, doc, variables)
         return doc
     
+    def _render_parts(self, compiled: CompiledTemplate, doc: Document, variables: Dict[str, Any]) -> set:
+        """Substitute the placeholders of the header and footer parts of a
+        rendered document; returns the keys used."""
+        if not compiled.parts:
+            return set()
+        parts = {part.partname: part for part in doc.part.package.iter_parts()}
+        keys = set()
+        for partname, runs in compiled.parts:
+            self._render_runs(runs, parts[partname].element, variables)
+            keys.update(s.key for _, segments in runs for s in segments if isinstance(s, Placeholder))
+        return keys
+    
     def generate_document(
         self,
         template_name: str,
@@ -72,7 +809,7 @@ class DocumentGenerator:
     ) -> str:
         """Generate a DOCX document from a template."""
         # Load template
-        doc = self.load_template(template_name)
+        compiled = self.compile_template(template_name)
         
         # Prepare variables
         template_vars = self.default_vars.copy()
@@ -80,15 +817,99 @@ class DocumentGenerator:
             template_vars.update(variables)
         
         # Replace variables
-        doc = self.replace_variables(doc, template_vars)
+        doc = self.render(compiled, template_vars)
         
         # Save document
+        return save_document(
+            doc, output_name, self.deterministic, self.clock, self.compact, self.compaction_stats)
+    
+    def generate_session(
+        self,
+        session_key: str,
+        template_name: str,
+        output_name: str,
+        variables: Optional[Dict[str, Any]] = None,
+    ) -> str:
+        """Generate a document, re-rendering only what changed since the
+        last call with the same session key.
+        
+        Paragraphs whose placeholder values are unchanged are kept from the
+        previous render, and only the main document part is re-serialised;
+        the other parts of the package are reused as saved. A change to a
+        key used by a condition falls back to a full render. With compact,
+        the whole package is still compacted on every call.
+        """
+        compiled = self.compile_template(template_name)
+        template_vars = self.default_vars.copy()
+        if variables:
+            template_vars.update(variables)
+        
+        with self._sessions_lock:
+            session = self._sessions.get(session_key)
+            if session is None or session.compiled is not compiled:
+                session = self._sessions[session_key] = RenderSession(compiled)
+            self._sessions.move_to_end(session_key)
+            while len(self._sessions) > MAX_SESSIONS:
+                self._sessions.popitem(last=False)
+        
+        with session.lock:
+            if session.doc is not None:
+                missing = object()
+                changed = {
+                    key for key in set(session.variables) | set(template_vars)
+                    if session.variables.get(key, missing) != template_vars.get(key, missing)
+                }
+            if session.doc is None or changed & session.condition_keys:
+                self._render_session(session, template_vars)
+            else:
+                for node, el, keys in session.emitted:
+                    if keys & changed:
+                        self._render_runs(node.runs, el, template_vars)
+            session.variables = template_vars
+            
+            main_part = session.doc.part
+            data = append_member(
+                session.base_package,
+                main_part.partname.membername,
+                serialize_part_xml(main_part.element),
+                self.deterministic,
+            )
+        if self.compact:
+            data = compact_package(data, self.deterministic, self.compaction_stats)
+        
         output_path = Path(output_name)
         output_path.parent.mkdir(parents=True, exist_ok=True)
-        doc.save(str(output_path))
-        
+        output_path.write_bytes(data)
         return str(output_path)
     
+    def _render_session(self, session: RenderSession, variables: Dict[str, Any]):
+        """Fully render a session and cache its package without the main part."""
+        compiled = session.compiled
+        session.emitted = []
+        session.condition_keys = set()
+        
+        doc = copy.deepcopy(compiled.document)
+        body = doc.element.body
+        sect_pr = body.find(qn('w:sectPr'))
+        add = sect_pr.addprevious if sect_pr is not None else body.append
+        self._render_nodes(compiled.nodes, variables, add, session)
+        # Headers and footers are saved in the base package, so their keys need a full render
+        session.condition_keys |= self._render_parts(compiled, doc, variables)
+        session.doc = doc
+        
+        if self.deterministic:
+            set_timestamps(doc, self.clock)
+        buffer = io.BytesIO()
+        doc.save(buffer)
+        main_member = doc.part.partname.membername
+        members = [(name, data) for name, data in read_package(buffer.getvalue()) if name != main_member]
+        session.base_package = write_package(members, self.deterministic)
+    
+    def close_session(self, session_key: str):
+        """Forget the state kept for a session."""
+        with self._sessions_lock:
+            self._sessions.pop(session_key, None)
+    
     def list_templates(self) -> list:
         """List available templates."""
         if not self.template_dir.exists():
@@ -99,6 +920,9 @@ class DocumentGenerator:
         for f in self.template_dir.rglob('*.docx'):
             # Get relative path and use that as template name
             rel_path = f.relative_to(self.template_dir)
+            # Partials are only included from other templates
+            if rel_path.parts[0] == 'partials':
+                continue
             template_name = str(rel_path).replace('\\', '/').replace('/', '_')
             templates.append(template_name)
         
@@ -109,15 +933,30 @@ def main():
     """CLI interface."""
     import argparse
     
+    # Subcommands
+    if sys.argv[1:2] == ['diff']:
+        from docx_compare import main as diff_main
+        sys.exit(diff_main(sys.argv[2:]))
+    if sys.argv[1:2] == ['compact']:
+        from docx_compact import main as compact_main
+        sys.exit(compact_main(sys.argv[2:]))
+    if sys.argv[1:2] == ['normalize']:
+        from docx_normalize import main as normalize_main
+        sys.exit(normalize_main(sys.argv[2:]))
+    
     parser = argparse.ArgumentParser(description='DocGen - Generate DOCX from templates')
     parser.add_argument('template', nargs='?', help='Template name (without .docx extension)')
     parser.add_argument('-o', '--output', default='output.docx', help='Output filename')
     parser.add_argument('-l', '--list', action='store_true', help='List available templates')
     parser.add_argument('-v', '--variable', action='append', help='Variable in format key=value')
+    parser.add_argument('--deterministic', action='store_true',
+                        help='Produce byte-identical output for identical input')
+    parser.add_argument('--compact', action='store_true',
+                        help='Strip editing noise and unused styles/media from the output')
     
     args = parser.parse_args()
     
-    generator = DocumentGenerator()
+    generator = DocumentGenerator(deterministic=args.deterministic, compact=args.compact)
     
     if args.list:
         templates = generator.list_templates()
@@ -174,6 +1013,8 @@ def main():
             variables,
         )
         print(f"Document generated: {output_path}")
+        if args.compact:
+            print(f"[DocGen] {generator.compaction_stats.summary()}")
     except Exception as e:
         print(f"Error: {e}")
 
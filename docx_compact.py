@@ -0,0 +1,299 @@
+#!/usr/bin/env python3
+"""
+DocGen - DOCX Compaction
+
+Shrink saved documents without changing how they render: strip rsid
+attributes, proofErr and lastRenderedPageBreak markers, drop empty property
+elements, merge adjacent runs with identical properties, prune styles that
+nothing references, and drop unreferenced images and the stale package
+thumbnail that python-docx copies from its default template. Thumbnails
+that differ from that default are kept.
+"""
+
+import functools
+import posixpath
+import sys
+import threading
+import zipfile
+from pathlib import Path
+from typing import List, Tuple
+
+from lxml import etree
+
+from docx_io import read_package, write_package
+
+W_NS = 'http://schemas.openxmlformats.org/wordprocessingml/2006/main'
+W = '{%s}' % W_NS
+XML_SPACE = '{http://www.w3.org/XML/1998/namespace}space'
+CT = '{http://schemas.openxmlformats.org/package/2006/content-types}'
+R_TYPES = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships/'
+
+# Markers Word adds while editing that do not affect rendering
+NOISE_TAGS = (W + 'proofErr', W + 'lastRenderedPageBreak')
+# Run children that can be moved into a neighbouring run unchanged
+TEXT_RUN_TAGS = (W + 'rPr', W + 't', W + 'tab', W + 'br', W + 'cr')
+# Elements whose w:val names a style
+STYLE_REF_TAGS = (
+    W + 'pStyle', W + 'rStyle', W + 'tblStyle',
+    W + 'styleLink', W + 'numStyleLink', W + 'defaultTableStyle',
+)
+# Style elements whose w:val names another style to keep
+STYLE_LINK_TAGS = (W + 'basedOn', W + 'next', W + 'link')
+STYLE_PARTS = ('word/styles.xml', 'word/stylesWithEffects.xml')
+IMAGE_REL = R_TYPES + 'image'
+THUMBNAIL_REL = 'http://schemas.openxmlformats.org/package/2006/relationships/metadata/thumbnail'
+
+
+class CompactionStats:
+    """Running totals of bytes saved, safe to share between threads."""
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.documents = 0
+        self.original_bytes = 0
+        self.compacted_bytes = 0
+    
+    def add(self, original: int, compacted: int):
+        """Record one compacted document."""
+        with self._lock:
+            self.documents += 1
+            self.original_bytes += original
+            self.compacted_bytes += compacted
+    
+    @property
+    def saved_bytes(self) -> int:
+        return self.original_bytes - self.compacted_bytes
+    
+    def summary(self) -> str:
+        """Describe the totals in one line."""
+        percent = self.saved_bytes * 100 / self.original_bytes if self.original_bytes else 0
+        return (f"Compacted {self.documents} document(s): "
+                f"{self.original_bytes} -> {self.compacted_bytes} bytes, "
+                f"saved {self.saved_bytes} ({percent:.1f}%)")
+
+
+def strip_noise(root):
+    """Remove rsids, proofing markers and empty property elements in place."""
+    for el in list(root.iter()):
+        if not isinstance(el.tag, str):
+            continue
+        for attr in [a for a in el.attrib if a.startswith(W + 'rsid')]:
+            del el.attrib[attr]
+        if el.tag in NOISE_TAGS or el.tag == W + 'rsids':
+            el.getparent().remove(el)
+        elif el.tag in (W + 'rPr', W + 'pPr') and len(el) == 0 and not el.attrib:
+            el.getparent().remove(el)
+
+
+def _join_texts(r):
+    """Join adjacent w:t elements of a run, keeping significant spaces."""
+    previous = None
+    for child in list(r):
+        if child.tag != W + 't':
+            previous = None
+            continue
+        if previous is not None:
+            previous.text = (previous.text or '') + (child.text or '')
+            r.remove(child)
+            child = previous
+        text = child.text or ''
+        if text != text.strip():
+            child.set(XML_SPACE, 'preserve')
+        previous = child
+
+
+def merge_runs(root) -> int:
+    """Merge adjacent text runs with identical properties, in one pass.
+    
+    The proofing markers, rsids and empty properties that keep runs apart
+    are dropped on the way. Returns the number of runs removed.
+    """
+    removed = 0
+    for parent in list(root.iter(W + 'p', W + 'hyperlink')):
+        for marker in parent.findall(W + 'proofErr'):
+            parent.remove(marker)
+        previous, previous_rpr = None, None
+        for r in list(parent.iterchildren(W + 'r')):
+            for attr in [a for a in r.attrib if a.startswith(W + 'rsid')]:
+                del r.attrib[attr]
+            for child in list(r):
+                if child.tag in NOISE_TAGS or (child.tag == W + 'rPr' and len(child) == 0 and not child.attrib):
+                    r.remove(child)
+            if not all(child.tag in TEXT_RUN_TAGS for child in r):
+                previous = None
+                continue
+            rpr = r.find(W + 'rPr')
+            rpr = etree.tostring(rpr, method='c14n') if rpr is not None else b''
+            if previous is not None and previous.getnext() is r and rpr == previous_rpr:
+                for child in list(r):
+                    if child.tag != W + 'rPr':
+                        previous.append(child)
+                parent.remove(r)
+                removed += 1
+                _join_texts(previous)
+                continue
+            previous, previous_rpr = r, rpr
+    return removed
+
+
+def _referenced_styles(parts) -> set:
+    """Collect the style ids referenced by content, numbering and settings parts."""
+    referenced = set()
+    for name, root in parts.items():
+        if name in STYLE_PARTS:
+            continue
+        for el in root.iter(*STYLE_REF_TAGS):
+            referenced.add(el.get(W + 'val'))
+    return referenced
+
+
+def prune_styles(styles_root, referenced: set) -> int:
+    """Remove styles that are neither defaults, referenced, nor a base of one.
+    
+    Returns the number of styles removed.
+    """
+    styles = {el.get(W + 'styleId'): el for el in styles_root.iterchildren(W + 'style')}
+    keep = {sid for sid, el in styles.items() if el.get(W + 'default') in ('1', 'true', 'on')}
+    pending = list(keep | (referenced & set(styles)))
+    while pending:
+        sid = pending.pop()
+        keep.add(sid)
+        for link in styles[sid].iterchildren(*STYLE_LINK_TAGS):
+            target = link.get(W + 'val')
+            if target in styles and target not in keep:
+                pending.append(target)
+    for sid, el in styles.items():
+        if sid not in keep:
+            styles_root.remove(el)
+    return len(styles) - len(keep)
+
+
+@functools.lru_cache(maxsize=None)
+def _default_thumbnail() -> bytes:
+    """Get the thumbnail of python-docx's default template."""
+    import docx
+    
+    template = Path(docx.__file__).parent / 'templates' / 'default.docx'
+    with zipfile.ZipFile(template) as zf:
+        return zf.read('docProps/thumbnail.jpeg')
+
+
+def _rels_source(rels_name: str) -> str:
+    """Get the part a relationships member belongs to ('' for the package)."""
+    folder, base = posixpath.split(rels_name)
+    return posixpath.join(posixpath.dirname(folder), base[:-len('.rels')]) if base != '.rels' else ''
+
+
+def _prune_relationships(members: dict, parts: dict) -> set:
+    """Drop image relationships nothing refers to and the default package thumbnail.
+    
+    Returns the names of parts that are no longer the target of any
+    relationship and can be dropped.
+    """
+    candidates = set()
+    targets = set()
+    for name in [n for n in members if n.endswith('.rels')]:
+        rels = etree.fromstring(members[name])
+        source = _rels_source(name)
+        used_ids = None
+        changed = False
+        for rel in list(rels):
+            if rel.get('TargetMode') == 'External':
+                continue
+            path = posixpath.normpath(posixpath.join(posixpath.dirname(source), rel.get('Target'))).lstrip('/')
+            rel_type = rel.get('Type')
+            if rel_type == IMAGE_REL and used_ids is None:
+                source_root = parts.get(source)
+                if source_root is None and source.endswith('.xml') and source in members:
+                    source_root = etree.fromstring(members[source])
+                # Ids are matched against every attribute value (r:embed, r:id, o:relid, ...)
+                used_ids = {value for el in source_root.iter() for value in el.attrib.values()} \
+                    if source_root is not None else None
+            if (rel_type == THUMBNAIL_REL and members.get(path) == _default_thumbnail()) or (
+                    rel_type == IMAGE_REL and used_ids is not None and rel.get('Id') not in used_ids):
+                rels.remove(rel)
+                candidates.add(path)
+                changed = True
+            else:
+                targets.add(path)
+        if changed:
+            members[name] = etree.tostring(rels, xml_declaration=True, encoding='UTF-8', standalone=True)
+    return candidates - targets
+
+
+def compact_members(members: List[Tuple[str, bytes]]) -> List[Tuple[str, bytes]]:
+    """Compact the (name, data) members of a DOCX package."""
+    members = dict(members)
+    parts = {
+        name: etree.fromstring(data) for name, data in members.items()
+        if name.startswith('word/') and name.endswith('.xml') and not name.startswith('word/theme/')
+    }
+    
+    for root in parts.values():
+        strip_noise(root)
+        merge_runs(root)
+    referenced = _referenced_styles(parts)
+    for name in STYLE_PARTS:
+        if name in parts:
+            prune_styles(parts[name], referenced)
+    
+    dropped = _prune_relationships(members, parts)
+    for name in dropped:
+        members.pop(name, None)
+    if dropped and '[Content_Types].xml' in members:
+        types = etree.fromstring(members['[Content_Types].xml'])
+        for override in list(types.iterchildren(CT + 'Override')):
+            if override.get('PartName').lstrip('/') in dropped:
+                types.remove(override)
+        members['[Content_Types].xml'] = etree.tostring(
+            types, xml_declaration=True, encoding='UTF-8', standalone=True)
+    
+    for name, root in parts.items():
+        if name in members:
+            members[name] = etree.tostring(root, xml_declaration=True, encoding='UTF-8', standalone=True)
+    return list(members.items())
+
+
+def compact_package(data: bytes, deterministic: bool = False, stats: CompactionStats = None) -> bytes:
+    """Compact a DOCX package, recording the bytes saved in stats."""
+    compacted = write_package(compact_members(read_package(data)), deterministic)
+    if stats is not None:
+        stats.add(len(data), len(compacted))
+    return compacted
+
+
+def main(argv=None) -> int:
+    """CLI interface."""
+    import argparse
+    
+    parser = argparse.ArgumentParser(
+        prog='docgen compact',
+        description='DocGen - Compact DOCX files in place',
+    )
+    parser.add_argument('files', nargs='+', help='DOCX files to compact')
+    parser.add_argument('-o', '--output', help='Output file (single input only; default: overwrite input)')
+    parser.add_argument('--deterministic', action='store_true',
+                        help='Write fixed zip timestamps and member order')
+    
+    args = parser.parse_args(argv)
+    if args.output and len(args.files) > 1:
+        parser.error('--output needs a single input file')
+    
+    stats = CompactionStats()
+    failures = 0
+    for name in args.files:
+        path = Path(name)
+        try:
+            data = path.read_bytes()
+            compacted = compact_package(data, args.deterministic, stats)
+            Path(args.output or path).write_bytes(compacted)
+            print(f"  {path}: {len(data)} -> {len(compacted)} bytes")
+        except Exception as e:
+            failures += 1
+            print(f"  {path}: error: {e}")
+    print(f"[DocGen] {stats.summary()}")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
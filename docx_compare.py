@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+"""
+DocGen - DOCX Comparison
+
+Compare two DOCX files semantically. Both packages are canonicalized first:
+zip member order and timestamps, rsid attributes, core property timestamps,
+attribute order and run fragmentation are ignored. Differences are reported
+in paragraph text, paragraph properties and run properties, then in any
+other part of the package.
+
+The self test renders every bundled template and sample through the
+reference and fast engines and checks that they produce equivalent output,
+with no placeholder left for the variables supplied.
+"""
+
+import re
+import sys
+import tempfile
+import zipfile
+from pathlib import Path
+from typing import Dict, List
+
+from lxml import etree
+
+from docx_compact import XML_SPACE, merge_runs
+
+W_NS = 'http://schemas.openxmlformats.org/wordprocessingml/2006/main'
+W = '{%s}' % W_NS
+DCTERMS = '{http://purl.org/dc/terms/}'
+
+# Core properties that change on every save
+VOLATILE_CORE_PROPERTIES = (DCTERMS + 'created', DCTERMS + 'modified')
+
+STORY_PART_RE = re.compile(r'word/(header|footer)\d*\.xml$')
+XMLNS_RE = re.compile(r'\sxmlns(:\w+)?="[^"]*"')
+
+
+def _local(name: str) -> str:
+    """Strip the namespace from a tag or attribute name."""
+    return name.rsplit('}', 1)[-1]
+
+
+def _strip_volatile(root):
+    """Remove rsids and save timestamps from an XML part in place."""
+    for el in root.iter():
+        if not isinstance(el.tag, str):
+            continue
+        for attr in [a for a in el.attrib if _local(a).startswith('rsid')]:
+            del el.attrib[attr]
+        if el.tag == W + 'rsids':
+            el.getparent().remove(el)
+        elif el.tag in VOLATILE_CORE_PROPERTIES:
+            el.text = None
+
+
+def _c14n(el) -> bytes:
+    """Serialize an element canonically (sorted attributes, no formatting)."""
+    if el is None:
+        return b''
+    return etree.tostring(el, method='c14n')
+
+
+def _run_text(r) -> str:
+    """Get the text of a w:r element, with tabs and breaks."""
+    parts = []
+    for child in r:
+        if child.tag == W + 't':
+            parts.append(child.text or '')
+        elif child.tag == W + 'tab':
+            parts.append('\t')
+        elif child.tag in (W + 'br', W + 'cr'):
+            parts.append('\n')
+    return ''.join(parts)
+
+
+def canonicalize(path) -> Dict[str, object]:
+    """Read a DOCX into member name -> canonical content.
+    
+    XML parts become parsed, normalized element trees; other members are
+    kept as bytes.
+    """
+    members = {}
+    with zipfile.ZipFile(path) as zf:
+        for name in sorted(zf.namelist()):
+            data = zf.read(name)
+            if name.endswith(('.xml', '.rels')):
+                root = etree.fromstring(data)
+                _strip_volatile(root)
+                merge_runs(root)
+                # Whether spaces are marked significant depends on where runs were split
+                for t in root.iter(W + 't'):
+                    t.attrib.pop(XML_SPACE, None)
+                members[name] = root
+            else:
+                members[name] = data
+    return members
+
+
+def _paragraph_summary(p):
+    """Get (text, pPr, [(run text, rPr)]) for a w:p element."""
+    runs = [(_run_text(r), _c14n(r.find(W + 'rPr'))) for r in p.iter(W + 'r')]
+    text = ''.join(text for text, _ in runs)
+    return text, _c14n(p.find(W + 'pPr')), runs
+
+
+def _short(value, limit: int = 80) -> str:
+    """Shorten a value for the report."""
+    if isinstance(value, bytes):
+        value = XMLNS_RE.sub('', value.decode('utf-8', 'replace'))
+    value = str(value)
+    return value if len(value) <= limit else value[:limit - 3] + '...'
+
+
+def compare_documents(path_a, path_b) -> List[str]:
+    """Compare two DOCX files and describe their semantic differences.
+    
+    Returns an empty list when the documents are equivalent.
+    """
+    a, b = canonicalize(path_a), canonicalize(path_b)
+    differences = []
+    
+    doc_a, doc_b = a.get('word/document.xml'), b.get('word/document.xml')
+    if doc_a is not None and doc_b is not None:
+        paras_a = list(doc_a.iter(W + 'p'))
+        paras_b = list(doc_b.iter(W + 'p'))
+        if len(paras_a) != len(paras_b):
+            differences.append(f"paragraph count: {len(paras_a)} != {len(paras_b)}")
+        for index, (pa, pb) in enumerate(zip(paras_a, paras_b), 1):
+            text_a, ppr_a, runs_a = _paragraph_summary(pa)
+            text_b, ppr_b, runs_b = _paragraph_summary(pb)
+            if text_a != text_b:
+                differences.append(f"paragraph {index}: text {_short(text_a)!r} != {_short(text_b)!r}")
+            if ppr_a != ppr_b:
+                differences.append(f"paragraph {index}: paragraph properties {_short(ppr_a)} != {_short(ppr_b)}")
+            if [r[1] for r in runs_a] != [r[1] for r in runs_b]:
+                differences.append(f"paragraph {index}: run properties differ")
+        if not differences and _c14n(doc_a) != _c14n(doc_b):
+            differences.append("word/document.xml: markup outside paragraph content differs")
+    
+    for name in sorted(set(a) | set(b)):
+        if name == 'word/document.xml':
+            continue
+        if name not in b:
+            differences.append(f"{name}: only in {path_a}")
+        elif name not in a:
+            differences.append(f"{name}: only in {path_b}")
+        else:
+            va, vb = a[name], b[name]
+            if not isinstance(va, bytes):
+                va, vb = _c14n(va), _c14n(vb)
+            if va != vb:
+                differences.append(f"{name}: differs")
+    
+    return differences
+
+
+def _render_pairs(work_dir: Path):
+    """Render every bundled template and sample through reference and fast engines.
+    
+    Yields (label, reference path, fast path, variables supplied).
+    """
+    from docx import Document
+    from document_generator import DocumentGenerator
+    from doc_formatter import DocumentFormatter
+    
+    root = Path(__file__).parent
+    generator = DocumentGenerator()
+    variables = dict(generator.default_vars, date='2026-01-01')
+    
+    for template_path in sorted(generator.template_dir.rglob('*.docx')):
+        name = template_path.stem
+        reference = work_dir / f"{name}.reference.docx"
+        doc = generator.replace_variables(Document(template_path), variables)
+        doc.save(str(reference))
+        fast = Path(generator.generate_document(name, str(work_dir / f"{name}.fast.docx"), variables))
+        yield f"template {name}", reference, fast, variables
+    
+    formatter = DocumentFormatter()
+    for sample in sorted(root.glob('*.md')):
+        if sample.name == 'README.md':
+            continue
+        content = sample.read_text(encoding='utf-8')
+        reference = Path(formatter.format_document_legacy(content, str(work_dir / f"{sample.stem}.reference.docx")))
+        fast = Path(formatter.format_document(content, str(work_dir / f"{sample.stem}.fast.docx"), extended=False))
+        yield f"sample {sample.name}", reference, fast, {}
+
+
+def leftover_placeholders(path, keys) -> List[str]:
+    """Find the placeholders for the given keys left in the document,
+    headers and footers of a DOCX file."""
+    from document_generator import PLACEHOLDER_RE
+    
+    leftovers = []
+    for name, root in canonicalize(path).items():
+        if name != 'word/document.xml' and not STORY_PART_RE.match(name):
+            continue
+        for p in root.iter(W + 'p'):
+            text = ''.join(_run_text(r) for r in p.iter(W + 'r'))
+            leftovers += [f"{name}: {m.group(0)}" for m in PLACEHOLDER_RE.finditer(text) if m.group(1) in keys]
+    return leftovers
+
+
+def self_test() -> int:
+    """Check the fast engines against the reference engines.
+    
+    Returns the number of renders that differ.
+    """
+    failures = 0
+    with tempfile.TemporaryDirectory() as work_dir:
+        for label, reference, fast, variables in _render_pairs(Path(work_dir)):
+            differences = compare_documents(reference, fast)
+            differences += [f"placeholder left: {leftover}" for leftover in leftover_placeholders(fast, variables)]
+            if differences:
+                failures += 1
+                print(f"  FAIL {label}")
+                for difference in differences:
+                    print(f"       {difference}")
+            else:
+                print(f"  ok   {label}")
+    return failures
+
+
+def main(argv=None) -> int:
+    """CLI interface."""
+    import argparse
+    
+    parser = argparse.ArgumentParser(
+        prog='docgen diff',
+        description='DocGen - Compare DOCX files semantically',
+    )
+    parser.add_argument('a', nargs='?', help='First DOCX file')
+    parser.add_argument('b', nargs='?', help='Second DOCX file')
+    parser.add_argument('--self-test', action='store_true',
+                        help='Render bundled templates and samples through reference and fast engines and compare')
+    
+    args = parser.parse_args(argv)
+    
+    if args.self_test:
+        failures = self_test()
+        print("[DocGen] Self test passed." if not failures else f"[DocGen] Self test failed: {failures} render(s) failed.")
+        return 1 if failures else 0
+    
+    if not args.a or not args.b:
+        parser.print_help()
+        return 2
+    
+    differences = compare_documents(args.a, args.b)
+    if not differences:
+        print("[DocGen] Documents are equivalent.")
+        return 0
+    for difference in differences:
+        print(difference)
+    return 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
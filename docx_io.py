@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+DocGen - DOCX Output
+
+Save documents for the generator and the formatter. In deterministic mode
+identical documents produce identical bytes: core property timestamps come
+from an injectable clock (or a fixed date), and the zip package is rewritten
+with fixed member timestamps and order. Saving can optionally run the
+compaction pass from docx_compact.
+"""
+
+import io
+import time
+import zipfile
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, List, Optional, Tuple
+
+# Zip member timestamp used in deterministic mode (earliest DOS date)
+FIXED_ZIP_TIME = (1980, 1, 1, 0, 0, 0)
+# Core property timestamp used in deterministic mode without a clock
+FIXED_TIMESTAMP = datetime(2000, 1, 1)
+# Package members written first, in this order
+LEADING_MEMBERS = ('[Content_Types].xml', '_rels/.rels')
+# Main document part, written last so it can be appended to a cached package
+MAIN_MEMBER = 'word/document.xml'
+
+
+def _member_info(name: str, deterministic: bool) -> zipfile.ZipInfo:
+    """Create the zip entry header for a package member."""
+    if deterministic:
+        info = zipfile.ZipInfo(name, date_time=FIXED_ZIP_TIME)
+        info.create_system = 0
+        info.external_attr = 0
+    else:
+        info = zipfile.ZipInfo(name, date_time=time.localtime()[:6])
+    info.compress_type = zipfile.ZIP_DEFLATED
+    return info
+
+
+def read_package(data: bytes) -> List[Tuple[str, bytes]]:
+    """Read the members of a zip package, in canonical order."""
+    source = zipfile.ZipFile(io.BytesIO(data))
+    names = source.namelist()
+    ordered = [n for n in LEADING_MEMBERS if n in names]
+    ordered += sorted(n for n in names if n not in LEADING_MEMBERS and n != MAIN_MEMBER)
+    ordered += [n for n in names if n == MAIN_MEMBER]
+    return [(name, source.read(name)) for name in ordered]
+
+
+def write_package(members: List[Tuple[str, bytes]], deterministic: bool = False) -> bytes:
+    """Write (name, data) members into a zip package, in the given order."""
+    output = io.BytesIO()
+    with zipfile.ZipFile(output, 'w', zipfile.ZIP_DEFLATED) as target:
+        for name, data in members:
+            target.writestr(_member_info(name, deterministic), data)
+    return output.getvalue()
+
+
+def append_member(package: bytes, name: str, data: bytes, deterministic: bool = False) -> bytes:
+    """Add a member at the end of a zip package without recompressing the others."""
+    output = io.BytesIO(package)
+    output.seek(0, io.SEEK_END)
+    with zipfile.ZipFile(output, 'a', zipfile.ZIP_DEFLATED) as target:
+        target.writestr(_member_info(name, deterministic), data)
+    return output.getvalue()
+
+
+def normalize_package(data: bytes) -> bytes:
+    """Rewrite a zip package with fixed member timestamps and order."""
+    return write_package(read_package(data), deterministic=True)
+
+
+def set_timestamps(doc, clock: Optional[Callable[[], datetime]] = None):
+    """Set stable core property timestamps for deterministic output."""
+    timestamp = clock() if clock else FIXED_TIMESTAMP
+    props = doc.core_properties
+    props.created = timestamp
+    props.modified = timestamp
+
+
+def save_document(
+    doc,
+    output_path: str,
+    deterministic: bool = False,
+    clock: Optional[Callable[[], datetime]] = None,
+    compact: bool = False,
+    stats=None,
+) -> str:
+    """Save a document, creating parent directories as needed.
+    
+    With compact, the package is compacted and the bytes saved are added
+    to stats (a docx_compact.CompactionStats) if given.
+    """
+    output = Path(output_path)
+    output.parent.mkdir(parents=True, exist_ok=True)
+    
+    if not deterministic and not compact:
+        doc.save(str(output))
+        return str(output)
+    
+    if deterministic:
+        set_timestamps(doc, clock)
+    buffer = io.BytesIO()
+    doc.save(buffer)
+    if compact:
+        from docx_compact import compact_package
+        data = compact_package(buffer.getvalue(), deterministic, stats)
+    else:
+        data = normalize_package(buffer.getvalue())
+    output.write_bytes(data)
+    return str(output)
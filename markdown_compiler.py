@@ -0,0 +1,345 @@
+#!/usr/bin/env python3
+"""
+DocGen - Markdown Compiler
+
+Compile text/markdown into DOCX body XML in two stages:
+- tokenize() turns the source into block tokens (headings, paragraphs,
+  lists, quotes, tables, signature lines) with inline emphasis spans
+- DocxEmitter compiles the paragraph/run properties of each block kind once
+  per document, then emits the XML for all blocks as text and parses it in
+  one go instead of building every paragraph through python-docx calls
+"""
+
+import copy
+import re
+from typing import Any, List, NamedTuple, Tuple
+from xml.sax.saxutils import escape
+
+from docx.enum.text import WD_ALIGN_PARAGRAPH
+from docx.oxml import parse_xml
+from docx.oxml.ns import nsdecls, qn
+from docx.shared import Pt, Cm
+from docx.text.run import Run
+from lxml import etree
+
+
+HEADING_RE = re.compile(r'^(#{1,6})\s+(.*)$')
+BULLET_RE = re.compile(r'^[-*+]\s+(.*)$')
+NUMBER_RE = re.compile(r'^(\d+[.)])\s+(.*)$')
+QUOTE_RE = re.compile(r'^>\s?(.*)$')
+TABLE_SEPARATOR_RE = re.compile(r'^\|?\s*:?-+:?\s*(\|\s*:?-+:?\s*)*\|?$')
+INLINE_RE = re.compile(
+    r'\*\*\*(.+?)\*\*\*'           # bold italic
+    r'|\*\*(.+?)\*\*|__(.+?)__'    # bold
+    r'|\*(.+?)\*'                  # italic
+    r'|`(.+?)`'                    # code
+)
+XMLNS_RE = re.compile(r'\sxmlns(:\w+)?="[^"]*"')
+
+# Fonts used by the markdown body/signature paths unless configured otherwise
+DEFAULT_BODY_FONT = "FangSong_GB2312"
+DEFAULT_BODY_SIZE = 16
+CODE_FONT = "Consolas"
+
+
+class Span(NamedTuple):
+    """Inline text span."""
+    text: str
+    bold: bool = False
+    italic: bool = False
+    code: bool = False
+
+
+class Block(NamedTuple):
+    """Block token.
+    
+    kind is one of title, heading1, heading2, lead (first paragraph after
+    the title), paragraph, signature, signature_first, bullet, number, quote
+    or table. Tables carry their rows in `rows` (first row is the header
+    when `header` is set); every other kind carries its inline spans.
+    """
+    kind: str
+    spans: Tuple[Span, ...] = ()
+    rows: Tuple[Tuple[Tuple[Span, ...], ...], ...] = ()
+    header: bool = False
+
+
+def parse_inline(text: str, extended: bool = True) -> Tuple[Span, ...]:
+    """Split text into emphasis spans."""
+    if not extended:
+        return (Span(text),)
+    
+    spans = []
+    pos = 0
+    for match in INLINE_RE.finditer(text):
+        if match.start() > pos:
+            spans.append(Span(text[pos:match.start()]))
+        bold_italic, bold, bold_alt, italic, code = match.groups()
+        if bold_italic is not None:
+            spans.append(Span(bold_italic, bold=True, italic=True))
+        elif bold is not None or bold_alt is not None:
+            spans.append(Span(bold if bold is not None else bold_alt, bold=True))
+        elif italic is not None:
+            spans.append(Span(italic, italic=True))
+        else:
+            spans.append(Span(code, code=True))
+        pos = match.end()
+    if pos < len(text):
+        spans.append(Span(text[pos:]))
+    return tuple(spans)
+
+
+def _split_row(line: str) -> List[str]:
+    """Split a markdown table row into cell texts."""
+    line = line.strip()
+    if line.startswith('|'):
+        line = line[1:]
+    if line.endswith('|'):
+        line = line[:-1]
+    return [cell.strip() for cell in line.split('|')]
+
+
+def tokenize(content: str, extended: bool = True) -> List[Block]:
+    """Tokenize text/markdown into blocks in a single pass.
+    
+    Each non-empty line is its own paragraph. A line starting with '---'
+    (after optional front matter) starts the signature section, which lasts
+    until the next heading. With extended=False only headings and the
+    signature section are recognised and everything else is plain text,
+    matching DocumentFormatter.format_document_legacy.
+    """
+    lines = content.strip().split('\n')
+    
+    # Skip YAML front matter
+    start = 0
+    if lines and lines[0].startswith('---'):
+        start = 1
+        for i, line in enumerate(lines[1:], 1):
+            if line.startswith('---'):
+                start = i + 1
+                break
+    
+    blocks = []
+    in_signature = False
+    signature_count = 0
+    after_title = False
+    i = start
+    while i < len(lines):
+        line = lines[i].strip()
+        i += 1
+        
+        if line.startswith('---'):
+            in_signature = True
+            signature_count = 0
+            continue
+        if not line:
+            continue
+        
+        match = HEADING_RE.match(line)
+        if match and (extended or len(match.group(1)) <= 3) and line.startswith(match.group(1) + ' '):
+            level = len(match.group(1))
+            kind = 'title' if level == 1 else 'heading1' if level == 2 else 'heading2'
+            blocks.append(Block(kind, parse_inline(match.group(2).strip(), extended)))
+            after_title = after_title or kind == 'title'
+            in_signature = False
+            continue
+        
+        if in_signature:
+            kind = 'signature_first' if signature_count == 0 else 'signature'
+            blocks.append(Block(kind, parse_inline(line, extended)))
+            signature_count += 1
+            continue
+        
+        block = None
+        if extended:
+            if line.startswith('|'):
+                rows = [line]
+                while i < len(lines) and lines[i].strip().startswith('|'):
+                    rows.append(lines[i].strip())
+                    i += 1
+                header = len(rows) > 1 and bool(TABLE_SEPARATOR_RE.match(rows[1]))
+                if header:
+                    del rows[1]
+                cells = tuple(
+                    tuple(parse_inline(cell) for cell in _split_row(row)) for row in rows
+                )
+                block = Block('table', rows=cells, header=header)
+            elif BULLET_RE.match(line):
+                block = Block('bullet', parse_inline(BULLET_RE.match(line).group(1)))
+            elif NUMBER_RE.match(line):
+                block = Block('number', parse_inline(line))
+            elif QUOTE_RE.match(line):
+                block = Block('quote', parse_inline(QUOTE_RE.match(line).group(1).strip()))
+        
+        if block is None:
+            # First paragraph after the title (greeting) gets no indent
+            kind = 'lead' if after_title else 'paragraph'
+            block = Block(kind, parse_inline(line, extended))
+        after_title = False
+        blocks.append(block)
+    
+    return blocks
+
+
+def _xml(el) -> str:
+    """Serialize an element without namespace declarations."""
+    if el is None:
+        return ''
+    return XMLNS_RE.sub('', etree.tostring(el, encoding='unicode'))
+
+
+def _text_xml(text: str) -> str:
+    """Build run content XML the way python-docx's Run.text setter does."""
+    parts = []
+    for piece in re.split(r'(\t|\r|\n)', text):
+        if piece == '\t':
+            parts.append('<w:tab/>')
+        elif piece in ('\r', '\n'):
+            parts.append('<w:br/>')
+        elif piece:
+            space = ' xml:space="preserve"' if len(piece.strip()) < len(piece) else ''
+            parts.append(f'<w:t{space}>{escape(piece)}</w:t>')
+    return ''.join(parts)
+
+
+class DocxEmitter:
+    """Emit block tokens into a document's body."""
+    
+    def __init__(self, doc, formatter):
+        """Initialize for a target document and the formatter whose config applies."""
+        self.doc = doc
+        self.formatter = formatter
+        self.config = formatter.config
+        # kind -> (pPr XML, prototype w:r element)
+        self._prototypes = {}
+        # (kind, bold, italic, code) -> rPr XML
+        self._run_props = {}
+    
+    def _build_prototype(self, kind: str):
+        """Build one paragraph of a kind through python-docx and return it."""
+        doc = self.doc
+        body = self.config.get('body', {})
+        body_font = body.get('font_family', DEFAULT_BODY_FONT)
+        body_size = body.get('font_size', DEFAULT_BODY_SIZE)
+        
+        if kind == 'title':
+            para = doc.add_heading('x', 0)
+            self.formatter.apply_style_to_paragraph(para, self.config.get('title', {}))
+            para.paragraph_format.space_after = Pt(24)
+        elif kind in ('heading1', 'heading2'):
+            para = doc.add_paragraph()
+            para.paragraph_format.left_indent = Cm(1.0)
+            para.add_run('x')
+            self.formatter.apply_style_to_paragraph(para, self.config.get(kind, {}))
+        elif kind in ('signature', 'signature_first'):
+            signature = self.config.get('signature', {})
+            para = doc.add_paragraph()
+            if kind == 'signature_first':
+                para.paragraph_format.space_before = Pt(48)
+            run = para.add_run('x')
+            run.font.name = signature.get('font_family', DEFAULT_BODY_FONT)
+            run.font.size = Pt(signature.get('font_size', DEFAULT_BODY_SIZE))
+            para.alignment = WD_ALIGN_PARAGRAPH.RIGHT
+        elif kind == 'lead':
+            para = doc.add_paragraph()
+            para.add_run('x')
+        else:
+            style = {'bullet': 'List Bullet', 'quote': 'Quote'}.get(kind)
+            para = doc.add_paragraph(style=style)
+            run = para.add_run('x')
+            if kind == 'paragraph':
+                para.paragraph_format.first_line_indent = Cm(1.0)
+            elif kind == 'number':
+                para.paragraph_format.left_indent = Cm(1.0)
+            run.font.name = body_font
+            run.font.size = Pt(body_size)
+        
+        p = para._p
+        p.getparent().remove(p)
+        return p
+    
+    def _prototype(self, kind: str) -> Tuple[str, Any]:
+        """Get the compiled pPr XML and prototype run for a block kind."""
+        prototype = self._prototypes.get(kind)
+        if prototype is None:
+            p = self._build_prototype(kind)
+            prototype = self._prototypes[kind] = (_xml(p.pPr), p.r_lst[0])
+        return prototype
+    
+    def _rpr(self, kind: str, span: Span) -> str:
+        """Get the rPr XML for a span in a block kind."""
+        key = (kind, span.bold, span.italic, span.code)
+        rpr = self._run_props.get(key)
+        if rpr is None:
+            r = self._prototype(kind)[1]
+            if span.bold or span.italic or span.code:
+                r = copy.deepcopy(r)
+                font = Run(r, None).font
+                if span.bold:
+                    font.bold = True
+                if span.italic:
+                    font.italic = True
+                if span.code:
+                    font.name = CODE_FONT
+            rpr = self._run_props[key] = _xml(r.rPr)
+        return rpr
+    
+    def _paragraph_xml(self, kind: str, spans) -> str:
+        """Build the XML for one paragraph."""
+        ppr = self._prototype(kind)[0]
+        runs = ''.join(
+            f'<w:r>{self._rpr(kind, span)}{_text_xml(span.text)}</w:r>' for span in spans
+        )
+        return f'<w:p>{ppr}{runs}</w:p>'
+    
+    def _table_xml(self, block: Block) -> str:
+        """Build the XML for a table."""
+        section = self.doc.sections[-1]
+        columns = max(len(row) for row in block.rows)
+        # EMU -> twips
+        width = int((section.page_width - section.left_margin - section.right_margin) / 635 / columns)
+        
+        if 'table' not in self._prototypes:
+            table = self.doc.add_table(rows=1, cols=1)
+            table.style = 'Table Grid'
+            self._prototypes['table'] = (_xml(table._tbl.tblPr), None)
+            table._tbl.getparent().remove(table._tbl)
+        tbl_pr = self._prototypes['table'][0]
+        
+        grid = f'<w:gridCol w:w="{width}"/>' * columns
+        rows = []
+        for index, row in enumerate(block.rows):
+            cells = []
+            for spans in list(row) + [()] * (columns - len(row)):
+                if block.header and index == 0:
+                    spans = tuple(span._replace(bold=True) for span in spans)
+                paragraph = self._paragraph_xml('cell', spans)
+                cells.append(f'<w:tc><w:tcPr><w:tcW w:type="dxa" w:w="{width}"/></w:tcPr>{paragraph}</w:tc>')
+            rows.append(f'<w:tr>{"".join(cells)}</w:tr>')
+        return f'<w:tbl>{tbl_pr}<w:tblGrid>{grid}</w:tblGrid>{"".join(rows)}</w:tbl>'
+    
+    def emit(self, blocks: List[Block]):
+        """Append blocks to the end of the document body."""
+        parts = []
+        for block in blocks:
+            if block.kind == 'table':
+                parts.append(self._table_xml(block))
+            else:
+                parts.append(self._paragraph_xml(block.kind, block.spans))
+        if not parts:
+            return
+        
+        fragment = parse_xml(f'<w:body {nsdecls("w")}>{"".join(parts)}</w:body>')
+        body = self.doc.element.body
+        sect_pr = body.find(qn('w:sectPr'))
+        for el in list(fragment):
+            if sect_pr is not None:
+                sect_pr.addprevious(el)
+            else:
+                body.append(el)
+
+
+def compile_markdown(content: str, doc, formatter, extended: bool = True):
+    """Compile text/markdown content into the body of doc."""
+    DocxEmitter(doc, formatter).emit(tokenize(content, extended))
+    return doc
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+DocGen - Template Filters
+
+Value filters for template placeholders, e.g. {{amount|cny_upper}} or
+{{date|fmt:%Y年%m月%d日}}. A filter is a function taking the value and an
+optional string argument (the text after ':'). Register custom filters with
+register_filter; filters marked pure may have their results memoized.
+"""
+
+import re
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+from typing import Any, Callable, Dict
+
+# name -> filter function
+FILTERS: Dict[str, Callable] = {}
+# names of filters whose result only depends on their arguments
+PURE_FILTERS = set()
+
+CNY_DIGITS = "零壹贰叁肆伍陆柒捌玖"
+CNY_UNITS = ("", "拾", "佰", "仟")
+CNY_GROUP_UNITS = ("", "万", "亿", "万亿")
+
+
+def register_filter(name: str, func: Callable = None, pure: bool = True):
+    """Register a filter globally. Can be used as a decorator."""
+    def decorator(f):
+        FILTERS[name] = f
+        if pure:
+            PURE_FILTERS.add(name)
+        else:
+            PURE_FILTERS.discard(name)
+        return f
+    
+    if func is not None:
+        return decorator(func)
+    return decorator
+
+
+def _cny_group(n: int) -> str:
+    """Convert 1-9999 to uppercase digits with units."""
+    result = ""
+    zero = False
+    for pos in range(3, -1, -1):
+        digit = n // 10 ** pos % 10
+        if digit == 0:
+            zero = bool(result)
+            continue
+        if zero:
+            result += "零"
+            zero = False
+        result += CNY_DIGITS[digit] + CNY_UNITS[pos]
+    return result
+
+
+def _cny_integer(n: int) -> str:
+    """Convert a non-negative integer to uppercase digits with units."""
+    if n == 0:
+        return "零"
+    groups = []
+    while n:
+        groups.append(n % 10000)
+        n //= 10000
+    if len(groups) > len(CNY_GROUP_UNITS):
+        raise ValueError("Amount too large for cny_upper")
+    
+    result = ""
+    zero = False
+    for index in range(len(groups) - 1, -1, -1):
+        group = groups[index]
+        if group == 0:
+            zero = bool(result)
+            continue
+        if result and (zero or group < 1000):
+            result += "零"
+        zero = False
+        result += _cny_group(group) + CNY_GROUP_UNITS[index]
+    return result
+
+
+@register_filter("cny_upper")
+def cny_upper(value) -> str:
+    """Format an amount in Chinese uppercase (大写金额), e.g. 壹仟贰佰叁拾肆元伍角陆分.
+    
+    Empty values are passed through, so a later default filter applies.
+    """
+    if value is None or str(value).strip() == "":
+        return value
+    try:
+        amount = Decimal(str(value).replace(",", "").strip())
+    except InvalidOperation:
+        amount = None
+    if amount is None or not amount.is_finite():
+        raise ValueError(f"cny_upper: not an amount: {value!r}")
+    amount = amount.quantize(Decimal("0.01"), ROUND_HALF_UP)
+    sign = "负" if amount < 0 else ""
+    cents = int(abs(amount) * 100)
+    yuan, jiao, fen = cents // 100, cents // 10 % 10, cents % 10
+    
+    if not cents:
+        return "零元整"
+    result = sign + (_cny_integer(yuan) + "元" if yuan else "")
+    if not jiao and not fen:
+        return result + "整"
+    if jiao:
+        result += CNY_DIGITS[jiao] + "角"
+    elif yuan:
+        result += "零"
+    if fen:
+        result += CNY_DIGITS[fen] + "分"
+    return result
+
+
+@register_filter("fmt")
+def fmt(value, spec: str = "%Y-%m-%d") -> str:
+    """Format a date (date, datetime or ISO string) with strftime, or a number with a format spec."""
+    if isinstance(value, str):
+        try:
+            value = datetime.fromisoformat(value.strip())
+        except ValueError:
+            return value
+    if isinstance(value, (date, datetime)):
+        return value.strftime(spec)
+    return format(value, spec)
+
+
+@register_filter("phone")
+def phone(value, separator: str = " ") -> str:
+    """Group an 11-digit mobile number as 3-4-4, e.g. 138 1234 5678."""
+    digits = re.sub(r"\D", "", str(value))
+    if len(digits) != 11:
+        return str(value)
+    return separator.join((digits[:3], digits[3:7], digits[7:]))
+
+
+@register_filter("mask")
+def mask(value, spec: str = "6,4") -> str:
+    """Mask the middle of a value, keeping the first and last characters given
+    by spec, e.g. ID 110101********1234 with the default 6,4."""
+    text = str(value)
+    head, _, tail = spec.partition(",")
+    head, tail = int(head or 0), int(tail or 0)
+    if head + tail >= len(text):
+        return text
+    return text[:head] + "*" * (len(text) - head - tail) + (text[-tail:] if tail else "")
+
+
+@register_filter("upper")
+def upper(value) -> str:
+    """Uppercase text."""
+    return str(value).upper()
+
+
+@register_filter("lower")
+def lower(value) -> str:
+    """Lowercase text."""
+    return str(value).lower()
+
+
+@register_filter("default")
+def default(value, fallback: str = "") -> Any:
+    """Use a fallback for empty values."""
+    return value if value not in (None, "") else fallback
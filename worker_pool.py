@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+DocGen - Prefork Worker Pool
+
+Generate documents in forked worker processes. The parent imports
+python-docx and parses and compiles every template once; workers are forked
+from it and share that memory copy-on-write instead of recompiling templates
+themselves.
+Workers are recycled after a fixed number of jobs to bound memory growth.
+"""
+
+import gc
+import multiprocessing
+from typing import Dict, Any, Iterable, Iterator, Optional, Tuple
+
+from document_generator import DocumentGenerator
+
+
+# Generator inherited by forked workers
+_generator = None
+
+
+def _generate(job: Tuple[str, str, Optional[Dict[str, Any]]]) -> str:
+    """Run a single generation job inside a worker."""
+    template_name, output_name, variables = job
+    return _generator.generate_document(template_name, output_name, variables)
+
+
+class PreforkPool:
+    """Pool of forked workers sharing preloaded templates.
+    
+    Only one pool can be active per process, since workers pick up the
+    generator from module state at fork time.
+    """
+    
+    def __init__(
+        self,
+        generator: DocumentGenerator = None,
+        processes: int = None,
+        max_jobs_per_worker: int = 100,
+    ):
+        """Preload templates, then fork the workers."""
+        global _generator
+        
+        if 'fork' not in multiprocessing.get_all_start_methods():
+            raise RuntimeError("Prefork mode requires os.fork, which this platform does not support")
+        
+        self.generator = generator or DocumentGenerator()
+        self.generator.preload_templates()
+        _generator = self.generator
+        
+        # Move everything loaded so far out of the collector's reach so that
+        # garbage collection in workers does not touch (and copy) shared pages
+        gc.collect()
+        if hasattr(gc, 'freeze'):
+            gc.freeze()
+        
+        # maxtasksperchild makes the pool fork a fresh worker from this
+        # (still preloaded) parent once a worker has run that many jobs
+        context = multiprocessing.get_context('fork')
+        self._pool = context.Pool(processes, maxtasksperchild=max_jobs_per_worker)
+    
+    def generate(
+        self,
+        template_name: str,
+        output_name: str,
+        variables: Optional[Dict[str, Any]] = None,
+    ) -> str:
+        """Generate one document in a worker and wait for it."""
+        return self._pool.apply(_generate, ((template_name, output_name, variables),))
+    
+    def generate_many(
+        self,
+        jobs: Iterable[Tuple[str, str, Optional[Dict[str, Any]]]],
+        chunksize: int = 1,
+    ) -> Iterator[str]:
+        """Generate (template_name, output_name, variables) jobs, yielding
+        output paths as they finish."""
+        return self._pool.imap_unordered(_generate, jobs, chunksize)
+    
+    def close(self):
+        """Stop accepting jobs and wait for the workers to exit."""
+        self._pool.close()
+        self._pool.join()
+        if hasattr(gc, 'unfreeze'):
+            gc.unfreeze()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is not None:
+            self._pool.terminate()
+        self.close()